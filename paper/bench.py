@@ -0,0 +1,223 @@
+"""bench.py - Benchmarks of scene construction, section renders and SPN inference.
+
+Three groups of benchmarks:
+
+- builders: the mobject builders of main.py, without rendering. The first
+  call (cold caches) is recorded apart from the following ones.
+- sections: every section of Main rendered alone at draft quality.
+- inference: SPN and credal inference on random networks of growing size.
+
+Every run appends one JSON line per benchmark to the history file, with the
+commit it was run on, and reports how it compares with the previous run of
+the same benchmark. With ``--threshold``, the exit status is 1 if a
+benchmark got slower than that ratio.
+
+    python bench.py inference --repeat 10
+    python bench.py --threshold 1.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import datetime
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from manim import tempconfig
+
+import credal
+import render
+import spn
+from dieface import DieFace
+from main import Main, get_die_faces
+
+HISTORY = Path(__file__).parent / "bench.jsonl"
+# Number of variables of the random SPNs of the inference group
+SIZES = (16, 32, 64, 128)
+BATCH = 256
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Return the time of the first call and statistics of `repeat` more calls.
+
+    With `repeat` 0, the statistics are those of the first call.
+    """
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    timed = times[1:] or times
+    return {
+        "first": times[0],
+        "min": min(timed),
+        "median": statistics.median(timed),
+    }
+
+
+def builders() -> dict[str, Callable[[], object]]:
+    with tempconfig({"dry_run": True}):
+        scene = Main()
+    return {
+        "DieFace": lambda: DieFace(6),
+        "get_die_faces": get_die_faces,
+        "get_probabilities_table": scene.get_probabilities_table,
+        "dice_joint_table": lambda: scene.dice_joint_table(
+            [[get_die_faces([1])[0] for _ in range(6)] for _ in range(6)]
+        ),
+        "computational_graph_independent": scene.computational_graph_independent,
+        "computational_graph_dependent": scene.computational_graph_dependent,
+        "incomplete_sum_graph": scene.incomplete_sum_graph,
+        "inconsistent_product_graph": scene.inconsistent_product_graph,
+    }
+
+
+def sections() -> dict[str, Callable[[], object]]:
+    # Movies and snapshots go to a temporary media directory, so that the
+    # benchmarks never replace those of incremental renders
+    media_dir = tempfile.mkdtemp(prefix="bench-")
+    atexit.register(shutil.rmtree, media_dir, ignore_errors=True)
+    overrides = {
+        "progress_bar": "none",
+        "disable_caching": True,
+        "media_dir": media_dir,
+        **render.TIERS["draft"],
+    }
+    snapshot_dir = str(Path(media_dir) / "sections")
+    return {
+        name: partial(render.render_section, name, overrides, snapshot_dir=snapshot_dir)
+        for name in Main.sections
+    }
+
+
+def inference() -> dict[str, Callable[[], object]]:
+    rng = np.random.default_rng(0)
+    benchmarks = {}
+    for n_vars in SIZES:
+        graph = spn.random_spn(n_vars, seed=0)
+        network = spn.compile(graph)
+        evidence = rng.integers(-1, 2, size=(BATCH, n_vars))
+        lower, upper = credal.contaminate(network, 0.1)
+        suffix = f"[{n_vars} vars, {len(network)} nodes]"
+        benchmarks.update(
+            {
+                f"compile{suffix}": partial(spn.compile, graph),
+                f"forward{suffix}": partial(network.forward, evidence),
+                f"forward_log{suffix}": partial(network.forward, evidence, log=True),
+                f"marginals{suffix}": partial(network.marginals, evidence),
+                f"credal_bounds{suffix}": partial(
+                    credal.bounds_batch, network, evidence, lower, upper
+                ),
+            }
+        )
+    return benchmarks
+
+
+GROUPS = {"builders": builders, "sections": sections, "inference": inference}
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_runs(history: Path) -> dict[tuple[str, str], dict]:
+    """Return the last record of every benchmark in `history`."""
+    last = {}
+    if history.exists():
+        for line in history.read_text().splitlines():
+            record = json.loads(line)
+            last[record["group"], record["name"]] = record
+    return last
+
+
+def run(
+    groups: list[str],
+    repeat: int = 5,
+    history: Path = HISTORY,
+    threshold: float | None = None,
+) -> bool:
+    """Run the benchmarks of `groups`, append them to `history` and report.
+
+    Return False if a benchmark is slower than `threshold` times its
+    previous run.
+    """
+    last = previous_runs(history)
+    date = datetime.datetime.now().isoformat(timespec="seconds")
+    revision = commit()
+    ok = True
+    with history.open("a") as fp:
+        for group in groups:
+            for name, function in GROUPS[group]().items():
+                record = {
+                    "date": date,
+                    "commit": revision,
+                    "group": group,
+                    "name": name,
+                    "repeat": repeat,
+                    **measure(function, repeat),
+                }
+                fp.write(json.dumps(record) + "\n")
+                fp.flush()
+                line = f"{group:10} {name:50} {record['median'] * 1e3:10.2f} ms"
+                before = last.get((group, name))
+                if before:
+                    ratio = record["median"] / before["median"]
+                    line += f"  x{ratio:.2f} vs {before['commit']}"
+                    if threshold and ratio > threshold:
+                        line += "  SLOWER"
+                        ok = False
+                print(line)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "groups",
+        nargs="*",
+        metavar="GROUP",
+        help=f"benchmark groups to run, among {', '.join(GROUPS)} (default: all)",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="timed calls after the first one"
+    )
+    parser.add_argument(
+        "--history", type=Path, default=HISTORY, help="JSON lines file of results"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="fail if a benchmark is slower than this ratio of its previous run",
+    )
+    args = parser.parse_args()
+    if args.repeat < 0:
+        parser.error("--repeat must be non-negative")
+    for group in args.groups:
+        if group not in GROUPS:
+            parser.error(f"unknown group {group!r}")
+    ok = run(args.groups or list(GROUPS), args.repeat, args.history, args.threshold)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""cache.py - Process-wide cache of parsed text mobjects.
+
+``MathTex``, ``Tex``, ``MarkupText``, ``Text`` and ``Paragraph`` built with
+the same arguments share their parsed geometry: the first call goes through
+LaTeX/Pango and SVG parsing, later calls return a copy of that prototype.
+Prototypes missing from memory are looked up in the on-disk
+:class:`pointstore.PointStore` before being built.
+
+    from cache import MathTex
+
+:func:`dieface.die_face` keeps its prototypes in the same cache.
+"""
+
+from __future__ import annotations
+
+import functools
+from collections import OrderedDict, namedtuple
+from typing import Callable
+
+import manim
+from manim import DEFAULT_FONT_SIZE, Mobject, config
+
+from pointstore import PointStore
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class MobjectCache:
+    """LRU cache of mobject prototypes, handing out copies."""
+
+    def __init__(self, maxsize: int = 1024, store: PointStore | None = None):
+        self.maxsize = maxsize
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._prototypes: OrderedDict[tuple, Mobject] = OrderedDict()
+
+    def get(self, key: tuple, build: Callable[[], Mobject]) -> Mobject:
+        """Return a copy of the prototype stored under `key`, building it if needed."""
+        try:
+            prototype = self._prototypes[key]
+        except KeyError:
+            self.misses += 1
+            if self.store is not None:
+                prototype = self.store.get(key, build)
+            else:
+                prototype = build()
+            self._prototypes[key] = prototype
+            if len(self._prototypes) > self.maxsize:
+                self._prototypes.popitem(last=False)
+        else:
+            self.hits += 1
+            self._prototypes.move_to_end(key)
+        return prototype.copy()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._prototypes))
+
+    def clear(self):
+        self._prototypes.clear()
+        self.hits = self.misses = 0
+
+
+cache = MobjectCache(store=PointStore.default())
+
+
+def cache_key(cls: type, args: tuple, kwargs: dict) -> tuple:
+    """Key a text mobject on its strings, font size, tex template and style."""
+    kwargs = dict(kwargs)
+    font_size = kwargs.pop("font_size", DEFAULT_FONT_SIZE)
+    tex_template = kwargs.pop("tex_template", None)
+    if issubclass(cls, manim.SingleStringMathTex):
+        tex_template = (tex_template or config.tex_template).body
+    return (
+        cls.__name__,
+        args,
+        font_size,
+        tex_template,
+        repr(sorted(kwargs.items())),
+    )
+
+
+def cached(cls: type) -> Callable[..., Mobject]:
+    """Return a factory building `cls` through the process-wide cache."""
+
+    @functools.wraps(cls, updated=())
+    def factory(*args, **kwargs):
+        return cache.get(cache_key(cls, args, kwargs), lambda: cls(*args, **kwargs))
+
+    return factory
+
+
+MathTex = cached(manim.MathTex)
+Tex = cached(manim.Tex)
+MarkupText = cached(manim.MarkupText)
+Text = cached(manim.Text)
+Paragraph = cached(manim.Paragraph)
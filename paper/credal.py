@@ -0,0 +1,123 @@
+"""credal.py - Lower and upper probabilities of robust (credal) SPNs.
+
+In a credal SPN the weights of each sum node are only known to lie in a
+credal set: intervals ``lower <= w <= upper`` (aligned with ``SPN.weights``)
+with the weights summing to one. Bounds are computed bottom-up, like a
+forward pass: product nodes multiply the bounds of their children and sum
+nodes solve
+
+    min (or max) sum_j w_j v_j  subject to  lower <= w <= upper, sum_j w_j = 1
+
+with a greedy that starts from the lower bounds and hands the remaining
+mass to the children with the smallest (or largest) value first.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from spn import PRODUCT, SPN, SUM
+
+
+def contaminate(spn: SPN, epsilon: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return the epsilon-contamination intervals around the weights of `spn`."""
+    is_sum = spn.kind[_edge_parents(spn)] == SUM
+    lower = np.where(is_sum, (1 - epsilon) * spn.weights, 1.0)
+    upper = np.where(is_sum, lower + epsilon, 1.0)
+    return lower, upper
+
+
+def _edge_parents(spn: SPN) -> np.ndarray:
+    """Return the parent node of every edge."""
+    return np.repeat(np.arange(len(spn)), np.diff(spn.child_ptr))
+
+
+def check(spn: SPN, lower: np.ndarray, upper: np.ndarray):
+    """Raise ValueError if the credal set of a sum node is empty."""
+    parents = _edge_parents(spn)
+    is_sum = spn.kind[parents] == SUM
+    low = np.bincount(parents[is_sum], lower[is_sum], minlength=len(spn))
+    high = np.bincount(parents[is_sum], upper[is_sum], minlength=len(spn))
+    empty = (spn.kind == SUM) & ((low > 1 + 1e-9) | (high < 1 - 1e-9))
+    empty[parents[is_sum & (upper < lower)]] = True
+    if np.any(empty):
+        raise ValueError(f"Empty credal sets at nodes {np.flatnonzero(empty).tolist()}")
+
+
+def minimize(values: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> float:
+    """Return min sum(w * values) over lower <= w <= upper, sum(w) = 1."""
+    order = np.argsort(values)
+    slack = (upper - lower)[order]
+    mass = 1.0 - lower.sum()
+    extra = np.clip(mass - (np.cumsum(slack) - slack), 0.0, slack)
+    return lower @ values + extra @ values[order]
+
+
+def _padded(spn: SPN, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the (S, C) edge indices of nodes start:stop, padded, and their mask."""
+    counts = np.diff(spn.child_ptr[start : stop + 1])
+    mask = np.arange(counts.max()) < counts[:, None]
+    edges = np.zeros(mask.shape, dtype=int)
+    edges[mask] = np.arange(spn.child_ptr[start], spn.child_ptr[stop])
+    return edges, mask
+
+
+def _minimize_batch(
+    values: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> np.ndarray:
+    """Vectorized :func:`minimize` over (N, S, C) values and (S, C) intervals.
+
+    Padded children must have zero lower and upper bounds.
+    """
+    order = np.argsort(values, axis=-1)
+    slack = np.take_along_axis(
+        np.broadcast_to(upper - lower, values.shape), order, axis=-1
+    )
+    mass = 1.0 - lower.sum(axis=-1, keepdims=True)
+    extra = np.clip(mass - (np.cumsum(slack, axis=-1) - slack), 0.0, slack)
+    return (lower * values).sum(axis=-1) + (
+        extra * np.take_along_axis(values, order, axis=-1)
+    ).sum(axis=-1)
+
+
+def bounds_batch(
+    spn: SPN, evidence: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the lower and upper probabilities of every evidence row.
+
+    The local problems of a whole layer of sum nodes are solved at once for
+    the whole batch, with children padded to the widest node of the layer.
+    """
+    check(spn, lower, upper)
+    evidence = np.atleast_2d(evidence)
+    low = np.empty((len(evidence), len(spn)))
+    low[:, : spn.n_leaves] = spn.leaves(evidence)
+    high = low.copy()
+    for kind, start, stop in spn.layers:
+        if kind == PRODUCT:
+            edges, offsets = spn.segments(start, stop)
+            children = spn.child_idx[edges]
+            low[:, start:stop] = np.multiply.reduceat(low[:, children], offsets, axis=1)
+            high[:, start:stop] = np.multiply.reduceat(
+                high[:, children], offsets, axis=1
+            )
+            continue
+        edges, mask = _padded(spn, start, stop)
+        children = spn.child_idx[edges]
+        node_lower = np.where(mask, lower[edges], 0.0)
+        node_upper = np.where(mask, upper[edges], 0.0)
+        low[:, start:stop] = _minimize_batch(
+            np.where(mask, low[:, children], 0.0), node_lower, node_upper
+        )
+        high[:, start:stop] = -_minimize_batch(
+            np.where(mask, -high[:, children], 0.0), node_lower, node_upper
+        )
+    return low[:, spn.root], high[:, spn.root]
+
+
+def bounds(
+    spn: SPN, evidence: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> tuple[float, float]:
+    """Return the lower and upper probability of one evidence row."""
+    low, high = bounds_batch(spn, evidence, lower, upper)
+    return low[0], high[0]
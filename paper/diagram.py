@@ -0,0 +1,210 @@
+"""diagram.py - Manim diagrams generated from compiled SPNs.
+
+:func:`spn_graph` draws an :class:`spn.SPN` of any size as a manim ``Graph``.
+All vertices, edges and labels are created in a single ``Graph`` call, labels
+come from the text cache (each distinct label is typeset once) and positions
+from the cached layered layout. Networks larger than the frame can show are
+drawn with less detail: subtrees beyond ``collapse_size`` nodes, or beyond
+the vertex budget of the frame width, collapse into a grey glyph
+labelled with the number of nodes they hide. Glyphs keep the level of the
+node they stand for.
+
+:func:`forward_pass` animates the evaluation of such a graph: it runs
+:meth:`spn.SPN.forward` and returns one ``AnimationGroup`` per layer of the
+network, so the number of animations grows with the depth, not the size.
+"""
+
+from __future__ import annotations
+
+from typing import Hashable
+
+import numpy as np
+from manim import (
+    BLACK,
+    BLUE_B,
+    DOWN,
+    GREY,
+    RED_B,
+    RIGHT,
+    AnimationGroup,
+    FadeIn,
+    Graph,
+    VGroup,
+    config,
+)
+
+import layouts
+from cache import MathTex
+from spn import LEAF, PRODUCT, SPN, SUM
+
+COLORS = {LEAF: BLUE_B, SUM: BLUE_B, PRODUCT: RED_B}
+
+# Vertices per scene unit of frame width that stay readable. The budget does
+# not depend on the pixel width, so all quality tiers draw the same diagram.
+VERTICES_PER_UNIT = 3
+
+
+def reached(spn: SPN, nodes: list[int]) -> np.ndarray:
+    """Return the (len(nodes), len(spn)) mask of the nodes below (and including) `nodes`.
+
+    The mask is propagated down one layer at a time, so a node shared by
+    several paths is reached once.
+    """
+    mask = np.zeros((len(nodes), len(spn)), dtype=bool)
+    mask[np.arange(len(nodes)), nodes] = True
+    for _, start, stop in reversed(spn.layers):
+        edges, _ = spn.segments(start, stop)
+        parents = np.repeat(np.arange(start, stop), spn.counts(start, stop))
+        np.logical_or.at(mask, (slice(None), spn.child_idx[edges]), mask[:, parents])
+    return mask
+
+
+def subtree_sizes(spn: SPN, nodes: list[int]) -> np.ndarray:
+    """Return the number of distinct nodes below (and including) each of `nodes`."""
+    return np.count_nonzero(reached(spn, nodes), axis=1)
+
+
+def visible_nodes(
+    spn: SPN, max_vertices: int, collapse_size: float = np.inf
+) -> tuple[list[int], set[int]]:
+    """Return the nodes to draw, breadth first, and those drawn as glyphs.
+
+    A node is drawn as a glyph when its subtree is larger than
+    `collapse_size` or when drawing its children would exceed `max_vertices`.
+    """
+    shown, collapsed = [spn.root], set()
+    seen = {spn.root}
+    level = [spn.root]
+    while level:
+        inner = [node for node in level if spn.kind[node] != LEAF]
+        # Sizes of a whole level at once, and only if they are needed
+        sizes = (
+            dict(zip(inner, subtree_sizes(spn, inner)))
+            if inner and np.isfinite(collapse_size)
+            else {}
+        )
+        level = []
+        for node in inner:
+            children = [
+                c
+                for c in spn.child_idx[spn.child_ptr[node] : spn.child_ptr[node + 1]]
+                if c not in seen
+            ]
+            too_large = node != spn.root and sizes.get(node, 0) > collapse_size
+            if too_large or len(shown) + len(children) > max_vertices:
+                collapsed.add(node)
+                continue
+            seen.update(children)
+            shown.extend(children)
+            level.extend(children)
+    return shown, collapsed
+
+
+def label(spn: SPN, node: int, hidden: int | None = None) -> str:
+    if hidden is not None:
+        return rf"[{hidden}]"
+    if spn.kind[node] == LEAF:
+        return rf"X_{{{spn.var[node]}}}={spn.value[node]}"
+    return "+" if spn.kind[node] == SUM else r"\times"
+
+
+def spn_graph(
+    spn: SPN,
+    max_vertices: int | None = None,
+    collapse_size: float = np.inf,
+    vertex_spacing: tuple[float, float] = (1, 1.5),
+    **kwargs,
+) -> Graph:
+    """Return a manim Graph of `spn`, collapsing what does not fit on screen.
+
+    Vertices are named after ``spn.names`` when the SPN has names, and after
+    node indices otherwise. `max_vertices` defaults to what the frame
+    width can show; other keyword arguments are passed to ``Graph``.
+    """
+    if max_vertices is None:
+        max_vertices = max(int(config.frame_width * VERTICES_PER_UNIT), 2)
+    shown, collapsed = visible_nodes(spn, max_vertices, collapse_size)
+    names: list[Hashable] = spn.names if spn.names is not None else range(len(spn))
+    drawn = set(shown)
+    # Nodes hidden by each glyph: those it reaches that are not drawn elsewhere
+    glyphs = [node for node in shown if node in collapsed]
+    hidden = reached(spn, glyphs)
+    hidden[:, shown] = False
+    hidden = dict(zip(glyphs, np.count_nonzero(hidden, axis=1).tolist()))
+    vertices = [names[node] for node in shown]
+    edges = [
+        (names[node], names[child])
+        for node in shown
+        if node not in collapsed
+        for child in spn.child_idx[spn.child_ptr[node] : spn.child_ptr[node + 1]]
+        if child in drawn
+    ]
+    labels = {
+        names[node]: MathTex(label(spn, node, hidden.get(node))).set_color(BLACK)
+        for node in shown
+    }
+    return Graph(
+        vertices=vertices,
+        edges=edges,
+        layout=layouts.layout(
+            vertices,
+            edges,
+            "layered",
+            root_vertex=names[spn.root],
+            layout_config=dict(
+                vertex_spacing=vertex_spacing,
+                collapsed=tuple(names[node] for node in glyphs),
+            ),
+        ),
+        root_vertex=names[spn.root],
+        labels=labels,
+        vertex_config={names[node]: {"fill_color": GREY} for node in collapsed},
+        **kwargs,
+    )
+
+
+def forward_pass(
+    spn: SPN,
+    evidence: list[int],
+    graph: Graph,
+    log: bool = False,
+    colors: dict[int, str] = COLORS,
+    zero_color: str = GREY,
+    font_size: float = 24,
+) -> tuple[list[AnimationGroup], VGroup]:
+    """Return the animations of the evaluation of `evidence`, and the value labels.
+
+    The i-th animation colors the vertices of the i-th layer (leaves first,
+    root last) and the edges to their children, and writes the value of
+    every non-zero node next to its vertex. Nodes of value zero, and the
+    edges to them, are greyed out. Nodes that are not in `graph`, e.g.
+    collapsed by :func:`spn_graph`, are skipped. The labels are not part of
+    `graph` and must be removed with it.
+    """
+    values = spn.forward(np.asarray(evidence)[None], log=log)[0]
+    zero = np.isneginf(values) if log else values == 0
+    names = spn.names if spn.names is not None else range(len(spn))
+    layers = [(LEAF, 0, spn.n_leaves), *spn.layers]
+    animations, labels = [], VGroup()
+    for kind, start, stop in layers:
+        layer = []
+        for node in range(start, stop):
+            if names[node] not in graph.vertices:
+                continue
+            vertex = graph.vertices[names[node]]
+            color = zero_color if zero[node] else colors[kind]
+            layer.append(vertex.animate.set_color(color))
+            for child in spn.child_idx[spn.child_ptr[node] : spn.child_ptr[node + 1]]:
+                edge = graph.edges.get((names[node], names[child]))
+                if edge is not None:
+                    layer.append(
+                        edge.animate.set_color(zero_color if zero[child] else color)
+                    )
+            if not zero[node]:
+                value = MathTex(f"{values[node]:.3g}", font_size=font_size)
+                value.set_color(color)
+                value.next_to(vertex, DOWN if kind == LEAF else RIGHT, buff=0.1)
+                labels.add(value)
+                layer.append(FadeIn(value))
+        animations.append(AnimationGroup(*layer))
+    return animations, labels
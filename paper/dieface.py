@@ -2,6 +2,8 @@
 
 from manim import *
 
+import cache
+
 
 class DieFace(VGroup):
     def __init__(
@@ -52,3 +54,33 @@ class DieFace(VGroup):
         super().__init__(square, arrangement)
         self.value = value
         self.index = value
+
+
+def die_face(
+    value: int,
+    side_length: float = 1.0,
+    corner_radius: float = 0.15,
+    stroke_color: str = WHITE,
+    stroke_width: float = 2.0,
+    fill_color: str = GREY_E,
+    dot_radius: float = 0.08,
+    dot_color: str = BLUE_B,
+    dot_coalesce_factor: float = 0.5,
+) -> DieFace:
+    """Return a copy of the DieFace built once for these arguments.
+
+    Prototypes go through :data:`cache.cache`, so they also persist in its
+    on-disk point store.
+    """
+    key = (
+        value,
+        side_length,
+        corner_radius,
+        stroke_color,
+        stroke_width,
+        fill_color,
+        dot_radius,
+        dot_color,
+        dot_coalesce_factor,
+    )
+    return cache.cache.get(("DieFace", *key), lambda: DieFace(*key))
@@ -0,0 +1,143 @@
+"""independence.py - Pairwise independence tests between categorical variables.
+
+:func:`contingency` counts the joint values of every pair of columns at
+once: with ``onehot`` the one-hot encoding of the rows (one column per value
+of every variable), ``onehot.T @ onehot`` holds all the pairwise
+contingency tables, and is accumulated over chunks of rows.
+
+:func:`components` G-tests every pair from those tables and returns the
+connected components of the dependency graph, i.e. the groups of variables
+a product node can split. The tables are cached per subset of rows: after a
+product split, the children have the same rows and fewer variables, and
+their tables are read from their parent's.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.stats import chi2
+
+# Cells per chunk of the one-hot matrix, float32 counts are exact below 2^24 rows
+CHUNK = 1 << 24
+
+
+def contingency(x: np.ndarray, cardinality: np.ndarray) -> np.ndarray:
+    """Return the (V, V, C, C) contingency tables of every pair of columns of `x`.
+
+    ``tables[i, j, a, b]`` counts the rows with ``x[:, i] == a`` and
+    ``x[:, j] == b``; C is the largest cardinality and values beyond the
+    cardinality of a variable have zero counts.
+    """
+    n_vars = x.shape[1]
+    offsets = np.concatenate(([0], np.cumsum(cardinality)))
+    width = offsets[-1]
+    counts = np.zeros((width + 1, width + 1))
+    step = max(CHUNK // (width + 1), 1)
+    for start in range(0, len(x), step):
+        chunk = x[start : start + step]
+        onehot = np.zeros((len(chunk), width + 1), dtype=np.float32)
+        onehot[np.arange(len(chunk))[:, None], chunk + offsets[:-1]] = 1.0
+        counts += onehot.T @ onehot
+    # Column of value a of variable v, or the last (empty) one beyond its cardinality
+    values = np.arange(cardinality.max())
+    columns = np.where(
+        values < cardinality[:, None], offsets[:-1, None] + values, width
+    )
+    return counts[columns[:, None, :, None], columns[None, :, None, :]].reshape(
+        n_vars, n_vars, len(values), len(values)
+    )
+
+
+def p_values(tables: np.ndarray, n: int) -> np.ndarray:
+    """Return the (V, V) p-values of the G-tests of independence of every pair.
+
+    Pairs involving a constant variable have no degree of freedom and a
+    p-value of 1.
+    """
+    diagonal = np.arange(tables.shape[0])
+    marginals = tables[diagonal, diagonal].diagonal(axis1=1, axis2=2)
+    expected = marginals[:, None, :, None] * marginals[None, :, None, :] / n
+    observed = tables > 0
+    ratio = np.divide(tables, expected, out=np.ones_like(tables), where=observed)
+    g = 2 * np.sum(tables * np.log(ratio), axis=(2, 3))
+    levels = np.count_nonzero(marginals, axis=1) - 1
+    dof = levels[:, None] * levels[None, :]
+    return np.where(dof > 0, chi2.sf(g, np.maximum(dof, 1)), 1.0)
+
+
+class ContingencyCache:
+    """LRU cache of the contingency tables of subsets of rows.
+
+    An entry holds the tables of the rows of a data matrix for some
+    variables, and serves any subset of these variables. Entries are keyed
+    by the identity of the matrix, which must not be modified in place, and
+    keep a reference to it: the identity of a live matrix is never reused.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[np.ndarray, np.ndarray, np.ndarray]] = (
+            OrderedDict()
+        )
+
+    def get(
+        self,
+        data: np.ndarray,
+        rows: np.ndarray,
+        variables: np.ndarray,
+        cardinality: np.ndarray,
+    ) -> np.ndarray:
+        """Return the tables of ``data[rows][:, variables]``.
+
+        `cardinality` holds the cardinality of every column of `data`.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(rows).tobytes())
+        digest.update(repr((id(data), data.shape)).encode())
+        key = digest.digest()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is data:
+            _, cached_variables, tables = entry
+            position = np.searchsorted(cached_variables, variables)
+            position = np.minimum(position, len(cached_variables) - 1)
+            if np.array_equal(cached_variables[position], variables):
+                self._entries.move_to_end(key)
+                c = cardinality[variables].max()
+                return tables[np.ix_(position, position)][:, :, :c, :c]
+        order = np.sort(variables)
+        tables = contingency(data[np.ix_(rows, order)], cardinality[order])
+        self._entries[key] = data, order, tables
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return tables[np.ix_(*[np.searchsorted(order, variables)] * 2)]
+
+    def clear(self):
+        self._entries.clear()
+
+
+def components(
+    data: np.ndarray,
+    rows: np.ndarray,
+    variables: np.ndarray,
+    cardinality: np.ndarray,
+    p_value: float = 0.001,
+    cache: ContingencyCache | None = None,
+) -> list[np.ndarray]:
+    """Return the groups of `variables` that are independent of each other on `rows`.
+
+    Two variables depend on each other if a G-test rejects their
+    independence at level `p_value`. Groups are the connected components of
+    that dependency graph, as positions in `variables`. The tables are read
+    from `cache` if given.
+    """
+    if cache is None:
+        tables = contingency(data[np.ix_(rows, variables)], cardinality[variables])
+    else:
+        tables = cache.get(data, rows, variables, cardinality)
+    dependent = p_values(tables, len(rows)) < p_value
+    n, labels = connected_components(csr_matrix(dependent), directed=False)
+    return [np.flatnonzero(labels == k) for k in range(n)]
@@ -0,0 +1,144 @@
+"""joint.py - Joint distributions stored as products of small factors.
+
+A :class:`FactorizedJoint` over N dice keeps one table per group of
+dependent dice instead of the dense 6^N table: N independent dice need 6N
+numbers. Marginalization, conditioning and products act on the factors,
+and dense tables are only built for the variables asked for.
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+
+class FactorizedJoint:
+    """Product of factors over disjoint groups of variables, times a constant.
+
+    Each factor is a pair ``(variables, table)`` where ``table`` has one axis
+    per variable, in the order of ``variables``.
+    """
+
+    def __init__(
+        self,
+        factors: list[tuple[tuple[int, ...], np.ndarray]],
+        scale: float = 1.0,
+    ):
+        variables = [v for vs, _ in factors for v in vs]
+        if len(variables) != len(set(variables)):
+            raise ValueError("Factors must have disjoint variables")
+        self.factors = [(tuple(vs), np.asarray(table)) for vs, table in factors]
+        self.scale = scale
+
+    @classmethod
+    def independent(cls, marginals: list[np.ndarray]) -> FactorizedJoint:
+        """Return the joint of independent variables with the given marginals."""
+        return cls([((v,), np.asarray(p)) for v, p in enumerate(marginals)])
+
+    @classmethod
+    def dice(cls, n: int, faces: int = 6) -> FactorizedJoint:
+        """Return the joint of `n` independent fair dice."""
+        return cls.independent([np.full(faces, 1 / faces)] * n)
+
+    @property
+    def variables(self) -> tuple[int, ...]:
+        return tuple(sorted(v for vs, _ in self.factors for v in vs))
+
+    @property
+    def shape(self) -> dict[int, int]:
+        """Return the cardinality of each variable."""
+        return {v: n for vs, t in self.factors for v, n in zip(vs, t.shape)}
+
+    @property
+    def size(self) -> int:
+        """Return the number of entries of the equivalent dense table."""
+        return math.prod(self.shape.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(table.nbytes for _, table in self.factors)
+
+    def _check_variables(self, variables, what: str):
+        """Raise ValueError if some of `variables` are not variables of the joint."""
+        unknown = sorted(set(variables) - set(self.variables))
+        if unknown:
+            raise ValueError(f"Unknown {what} variables {unknown}")
+
+    def marginalize(self, variables: set[int]) -> FactorizedJoint:
+        """Sum out `variables`."""
+        factors, scale = [], self.scale
+        for vs, table in self.factors:
+            axes = tuple(i for i, v in enumerate(vs) if v in variables)
+            table = table.sum(axis=axes)
+            kept = tuple(v for v in vs if v not in variables)
+            if kept:
+                factors.append((kept, table))
+            else:
+                scale *= float(table)
+        return FactorizedJoint(factors, scale)
+
+    def condition(
+        self, evidence: dict[int, int], normalize: bool = True
+    ) -> FactorizedJoint:
+        """Fix the variables of `evidence` to their values.
+
+        With `normalize`, return the conditional distribution of the other
+        variables, otherwise their joint with the evidence. Raise ValueError
+        for unknown variables or values, and when normalizing on evidence of
+        probability zero.
+        """
+        self._check_variables(evidence, "evidence")
+        shape = self.shape
+        invalid = {v: k for v, k in evidence.items() if not 0 <= k < shape[v]}
+        if invalid:
+            raise ValueError(f"Evidence values out of range: {invalid}")
+        factors, scale = [], self.scale
+        for vs, table in self.factors:
+            index = tuple(evidence.get(v, slice(None)) for v in vs)
+            table = table[index]
+            kept = tuple(v for v in vs if v not in evidence)
+            if kept:
+                factors.append((kept, table))
+            else:
+                scale *= float(table)
+        joint = FactorizedJoint(factors, scale)
+        if normalize:
+            if joint.scale == 0 or any(t.sum() == 0 for _, t in joint.factors):
+                raise ValueError(f"Evidence {evidence} has probability zero")
+            joint = FactorizedJoint([(vs, t / t.sum()) for vs, t in joint.factors], 1.0)
+        return joint
+
+    def product(self, other: FactorizedJoint) -> FactorizedJoint:
+        """Return the joint of two distributions over disjoint variables."""
+        return FactorizedJoint(self.factors + other.factors, self.scale * other.scale)
+
+    def prob(self, assignment: dict[int, int]) -> float:
+        """Return the probability of a (partial) assignment."""
+        joint = self.condition(assignment, normalize=False)
+        return joint.marginalize(set(joint.variables)).scale
+
+    def table(
+        self, variables: tuple[int, ...], evidence: dict[int, int] | None = None
+    ) -> np.ndarray:
+        """Return the dense table over `variables`, given `evidence`.
+
+        Only the factors touching `variables` are expanded, every other
+        variable is summed out first. Raise ValueError if `variables` are
+        unknown, repeated or in `evidence`.
+        """
+        self._check_variables(variables, "table")
+        if len(set(variables)) != len(variables):
+            raise ValueError(f"Repeated table variables in {variables}")
+        observed = sorted(set(variables) & set(evidence or {}))
+        if observed:
+            raise ValueError(f"Table variables {observed} are also in the evidence")
+        joint = self.condition(evidence or {}, normalize=False)
+        joint = joint.marginalize(set(joint.variables) - set(variables))
+        if not joint.factors:
+            return np.array(joint.scale)
+        axes = {v: i for i, v in enumerate(variables)}
+        operands = []
+        for vs, table in joint.factors:
+            operands += [table, [axes[v] for v in vs]]
+        return joint.scale * np.einsum(*operands, list(range(len(variables))))
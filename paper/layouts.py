@@ -0,0 +1,157 @@
+"""layouts.py - Cached graph layouts, and a layered layout for SPN DAGs.
+
+:func:`layout` memoizes vertex positions on the graph structure, root and
+layout configuration, so the SPN diagrams are laid out once per process
+however many times they are rebuilt.
+
+:func:`layered` draws a rooted DAG top-down: every node sits one level below
+its deepest parent, leaves share the bottom level (collapsed vertices,
+drawn without their children, keep their own level), leaves are ordered by the
+mean position of their parents and inner nodes are centered over their
+children, so shared children end up between the nodes sharing them.
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+from typing import Hashable
+
+import networkx as nx
+import numpy as np
+from manim.mobject.graph import _determine_graph_layout
+
+
+def _grouped(keys: np.ndarray, n_groups: int) -> list[np.ndarray]:
+    """Return the indices of `keys` equal to 0, 1, ... n_groups - 1, in order."""
+    order = np.argsort(keys, kind="stable")
+    return np.split(order, np.cumsum(np.bincount(keys, minlength=n_groups))[:-1])
+
+
+def layered(
+    vertices: list[Hashable],
+    edges: list[tuple[Hashable, Hashable]],
+    root_vertex: Hashable,
+    vertex_spacing: tuple[float, float] = (1, 1),
+    collapsed: tuple[Hashable, ...] = (),
+) -> dict[Hashable, np.ndarray]:
+    """Return positions of a DAG whose edges point from parents to children.
+
+    Vertices in `collapsed` have no drawn children but are not leaves: they
+    stay at their level instead of moving down to the leaves. Raise
+    ValueError if some vertices are not reachable from `root_vertex`, or are
+    on a cycle.
+    """
+    n = len(vertices)
+    index = {v: i for i, v in enumerate(vertices)}
+    ends = np.fromiter(
+        map(index.__getitem__, itertools.chain.from_iterable(edges)),
+        dtype=int,
+        count=2 * len(edges),
+    )
+    parent, child = ends.reshape(-1, 2).T
+    n_parents = np.bincount(child, minlength=n)
+    n_children = np.bincount(parent, minlength=n)
+    out_edges = np.argsort(parent, kind="stable")
+    out_ptr = np.cumsum(n_children) - n_children
+
+    # Levels from the longest path to the root, one frontier of nodes whose
+    # parents all have their level at a time
+    level = np.zeros(n, dtype=int)
+    remaining = n_parents.copy()
+    reached = np.zeros(n, dtype=bool)
+    frontier = np.array([index[root_vertex]])
+    while len(frontier):
+        reached[frontier] = True
+        counts = n_children[frontier]
+        offsets = np.repeat(out_ptr[frontier] - np.cumsum(counts) + counts, counts)
+        e = out_edges[offsets + np.arange(len(offsets))]
+        np.maximum.at(level, child[e], level[parent[e]] + 1)
+        np.subtract.at(remaining, child[e], 1)
+        frontier = np.unique(child[e][remaining[child[e]] == 0])
+    if not reached.all():
+        unreached = [vertices[i] for i in np.flatnonzero(~reached)]
+        raise ValueError(
+            f"Vertices {unreached[:10]} are not below the root {root_vertex!r}: "
+            "they or some of their parents are not reachable from it, or are "
+            "on a cycle"
+        )
+    depth = int(level.max())
+    is_collapsed = np.zeros(n, dtype=bool)
+    is_collapsed[[index[v] for v in collapsed]] = True
+    level[(n_children == 0) & ~is_collapsed] = depth
+    levels = _grouped(level, depth + 1)
+    # Ties are broken by the first edge to a node, so siblings keep their order
+    first = np.full(n, len(child))
+    np.minimum.at(first, child, np.arange(len(child)))
+
+    # Top-down: order each level by the mean position of the parents
+    x = np.zeros(n)
+    for nodes, e in zip(levels[1:], _grouped(level[child], depth + 1)[1:]):
+        mean = np.bincount(child[e], x[parent[e]], minlength=n)[nodes]
+        nodes[:] = nodes[np.lexsort((first[nodes], mean / n_parents[nodes]))]
+        x[nodes] = np.arange(len(nodes)) - (len(nodes) - 1) / 2
+
+    # Bottom-up: order by and center over the children, then remove overlaps
+    x[levels[-1]] = np.arange(len(levels[-1]))
+    for nodes, e in zip(
+        reversed(levels[:-1]), reversed(_grouped(level[parent], depth + 1)[:-1])
+    ):
+        inner = n_children[nodes] > 0
+        center = np.bincount(parent[e], x[child[e]], minlength=n)[nodes]
+        center /= np.maximum(n_children[nodes], 1)
+        # Collapsed vertices follow their left neighbour of the top-down order
+        position = np.arange(len(nodes))
+        left = np.maximum.accumulate(np.where(inner, position, -1))
+        start = center[inner].min() - 1 if inner.any() else 0.0
+        center = np.where(
+            inner, center, np.where(left >= 0, center[left], start) + position - left
+        )
+        order = np.argsort(center, kind="stable")
+        # x[i] = max(center[i], x[i - 1] + 1), in the order of the centers
+        x[nodes[order]] = position + np.maximum.accumulate(center[order] - position)
+
+    center = np.array([(x.min() + x.max()) / 2, -depth / 2, 0])
+    scale = np.array([*vertex_spacing, 0])
+    positions = (np.stack([x, -level, np.zeros(n)], axis=1) - center) * scale
+    return dict(zip(vertices, positions))
+
+
+@functools.lru_cache(maxsize=256)
+def _layout(vertices, edges, layout, root_vertex, layout_scale, layout_config):
+    layout_config = dict(layout_config)
+    if layout == "layered":
+        return layered(list(vertices), list(edges), root_vertex, **layout_config)
+    graph = nx.Graph()
+    graph.add_nodes_from(vertices)
+    graph.add_edges_from(edges)
+    return _determine_graph_layout(
+        graph,
+        layout=layout,
+        layout_scale=layout_scale,
+        layout_config=layout_config,
+        root_vertex=root_vertex,
+    )
+
+
+def layout(
+    vertices: list[Hashable],
+    edges: list[tuple[Hashable, Hashable]],
+    layout: str = "layered",
+    root_vertex: Hashable | None = None,
+    layout_scale: float = 2,
+    layout_config: dict | None = None,
+) -> dict[Hashable, np.ndarray]:
+    """Return the (cached) positions of a graph, for manim's ``Graph(layout=...)``.
+
+    `layout` is "layered" or any layout name manim's Graph accepts.
+    """
+    positions = _layout(
+        tuple(vertices),
+        tuple(edges),
+        layout,
+        root_vertex,
+        layout_scale,
+        tuple(sorted((layout_config or {}).items())),
+    )
+    return {v: np.array(p) for v, p in positions.items()}
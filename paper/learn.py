@@ -0,0 +1,237 @@
+"""learn.py - Learn SPN structures from categorical data, LearnSPN style.
+
+:func:`learn` grows a network top-down from a matrix of observations, one
+row per instance and one column per variable (e.g. dice outcomes):
+
+- a single variable becomes a sum node over its indicators, weighted by the
+  smoothed frequencies of its values;
+- with fewer than ``min_rows`` rows, the variables are fully factorized;
+- variables that split into independent groups (see
+  :func:`independence.components`) become a product node over the groups;
+- otherwise the rows are clustered in two by k-means on their one-hot
+  encoding, and become a sum node weighted by the size of the clusters.
+
+Independent sub-problems run on a process pool. The data matrix is copied
+once to shared memory, which every worker maps, so tasks only carry the
+indices of their rows and variables. Sub-problems smaller than
+``local_size`` cells are learned entirely by one worker.
+"""
+
+from __future__ import annotations
+
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import networkx as nx
+import numpy as np
+
+import independence
+import spn
+
+# Data matrix of the process: the learner's own in serial mode, a view of
+# the shared memory block in workers. The tables cache is per process too.
+_data: np.ndarray | None = None
+_shm: shared_memory.SharedMemory | None = None
+_cache: independence.ContingencyCache | None = None
+
+
+class Options(NamedTuple):
+    cardinality: np.ndarray
+    min_rows: int = 100
+    p_value: float = 0.001
+    alpha: float = 1.0
+    iterations: int = 10
+    seed: int = 0
+
+
+def _attach(name: str, shape: tuple[int, ...], dtype: np.dtype):
+    """Map the shared data matrix in a worker."""
+    global _data, _shm, _cache
+    _shm = shared_memory.SharedMemory(name=name)
+    _data = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+    _cache = independence.ContingencyCache()
+
+
+def cluster(
+    x: np.ndarray, cardinality: np.ndarray, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Return labels 0 or 1 of the rows of `x`, by 2-means on their one-hot encoding.
+
+    Centroids are stored as (2, n_vars, max_cardinality) frequencies, so the
+    one-hot matrix is never built.
+    """
+    n, n_vars = x.shape
+    columns = np.arange(n_vars)
+    centroids = np.zeros((2, n_vars, cardinality.max()))
+    for k, row in enumerate(rng.choice(n, size=2, replace=False)):
+        centroids[k, columns, x[row]] = 1.0
+    labels = None
+    for _ in range(iterations):
+        # argmin |x - c|^2 = argmax 2 x.c - |c|^2, as |x|^2 = n_vars
+        scores = -np.sum(centroids**2, axis=(1, 2))[None, :].repeat(n, axis=0)
+        for v in range(n_vars):
+            scores += 2 * centroids[:, v, x[:, v]].T
+        new_labels = np.argmax(scores, axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        sizes = np.bincount(labels, minlength=2)
+        if np.any(sizes == 0):
+            break
+        for v in range(n_vars):
+            counts = np.bincount(
+                labels * centroids.shape[2] + x[:, v],
+                minlength=2 * centroids.shape[2],
+            )
+            centroids[:, v] = counts.reshape(2, -1) / sizes[:, None]
+    return labels
+
+
+def _frequencies(
+    x: np.ndarray, cardinality: np.ndarray, alpha: float
+) -> list[np.ndarray]:
+    """Return the smoothed frequencies of the values of every column of `x`."""
+    return [
+        (np.bincount(column, minlength=c) + alpha) / (len(column) + alpha * c)
+        for column, c in zip(x.T, cardinality)
+    ]
+
+
+def _step(name: str, rows: np.ndarray, variables: np.ndarray, options: Options):
+    """Decide the node learned from `rows` and `variables`.
+
+    Return ("leaf", frequencies) for a single variable, ("factorize",
+    frequencies of each variable), ("product", groups of variables) or
+    ("sum", groups of rows).
+    """
+    x = _data[np.ix_(rows, variables)]
+    cardinality = options.cardinality[variables]
+    if len(variables) == 1 or len(rows) < options.min_rows:
+        kind = "leaf" if len(variables) == 1 else "factorize"
+        return kind, _frequencies(x, cardinality, options.alpha)
+    groups = independence.components(
+        _data, rows, variables, options.cardinality, options.p_value, _cache
+    )
+    if len(groups) > 1:
+        return "product", [variables[group] for group in groups]
+    rng = np.random.default_rng([options.seed, zlib.crc32(name.encode())])
+    labels = cluster(x, cardinality, options.iterations, rng)
+    if np.all(labels == labels[0]):
+        return "factorize", _frequencies(x, cardinality, options.alpha)
+    return "sum", [rows[labels == 0], rows[labels == 1]]
+
+
+def _univariate(g: nx.DiGraph, name: str, var: int, frequencies: np.ndarray):
+    g.add_node(name, kind="sum")
+    for value, weight in enumerate(frequencies):
+        leaf = f"x{var}={value}"
+        g.add_node(leaf, kind="leaf", var=int(var), value=value)
+        g.add_edge(name, leaf, weight=float(weight))
+
+
+def _expand(
+    g: nx.DiGraph, name: str, rows: np.ndarray, variables: np.ndarray, result
+) -> list[tuple[str, np.ndarray, np.ndarray]]:
+    """Add the node of a :func:`_step` result to `g` and return its sub-problems."""
+    kind, parts = result
+    if kind == "leaf":
+        _univariate(g, name, variables[0], parts[0])
+        return []
+    if kind == "factorize":
+        g.add_node(name, kind="product")
+        for i, (var, frequencies) in enumerate(zip(variables, parts)):
+            _univariate(g, f"{name}.{i}", var, frequencies)
+            g.add_edge(name, f"{name}.{i}")
+        return []
+    g.add_node(name, kind=kind)
+    tasks = []
+    for i, part in enumerate(parts):
+        child = f"{name}.{i}"
+        if kind == "product":
+            g.add_edge(name, child)
+            tasks.append((child, rows, part))
+        else:
+            g.add_edge(name, child, weight=len(part) / len(rows))
+            tasks.append((child, part, variables))
+    return tasks
+
+
+def _learn_local(
+    name: str, rows: np.ndarray, variables: np.ndarray, options: Options
+) -> nx.DiGraph:
+    """Learn the whole sub-network of a sub-problem in this process."""
+    g = nx.DiGraph()
+    tasks = [(name, rows, variables)]
+    while tasks:
+        task = tasks.pop()
+        tasks += _expand(g, *task, _step(*task, options))
+    return g
+
+
+def learn(
+    data: np.ndarray,
+    min_rows: int = 100,
+    p_value: float = 0.001,
+    alpha: float = 1.0,
+    jobs: int | None = None,
+    local_size: int = 1 << 16,
+    seed: int = 0,
+) -> spn.SPN:
+    """Learn an SPN from an (N, V) matrix of non-negative integer observations.
+
+    Variable v takes values 0 to ``data[:, v].max()``. With ``jobs=1`` the
+    network is learned in this process, otherwise on `jobs` worker
+    processes (default: one per CPU). The result does not depend on `jobs`.
+    """
+    global _data, _cache
+    data = np.asarray(data)
+    if data.ndim != 2 or not len(data) or data.min() < 0:
+        raise ValueError("Data must be a non-empty matrix of non-negative integers")
+    data = data.astype(np.min_scalar_type(data.max()))
+    cardinality = data.max(axis=0).astype(int) + 1
+    options = Options(cardinality, min_rows, p_value, alpha, seed=seed)
+    root = ("r", np.arange(len(data)), np.arange(data.shape[1]))
+
+    if jobs == 1:
+        _data, _cache = data, independence.ContingencyCache()
+        try:
+            g = _learn_local(*root, options)
+        finally:
+            _data = _cache = None
+    else:
+        g = nx.DiGraph()
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+            with ProcessPoolExecutor(
+                jobs, initializer=_attach, initargs=(shm.name, data.shape, data.dtype)
+            ) as pool:
+
+                def submit(name, rows, variables):
+                    local = len(rows) * len(variables) <= local_size
+                    function = _learn_local if local else _step
+                    future = pool.submit(function, name, rows, variables, options)
+                    pending[future] = (local, name, rows, variables)
+
+                pending = {}
+                submit(*root)
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        local, *task = pending.pop(future)
+                        if local:
+                            g.update(future.result())
+                        else:
+                            for child in _expand(g, *task, future.result()):
+                                submit(*child)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    # Insert nodes and edges in a fixed order, whatever order workers finished in
+    ordered = nx.DiGraph()
+    ordered.add_nodes_from(sorted(g.nodes(data=True)))
+    ordered.add_edges_from(sorted(g.edges(data=True)))
+    return spn.compile(ordered)
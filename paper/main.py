@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 import itertools as it
+from pathlib import Path
 
 import networkx as nx
 from manim import *
 
-from dieface import DieFace
+import diagram
+import layouts
+import snapshot
+import spn
+import writer
+from cache import MarkupText, MathTex, Paragraph, Tex, Text
+from dieface import die_face
+from joint import FactorizedJoint
 
 
 def get_die_faces(
@@ -23,7 +31,7 @@ def get_die_faces(
     """Return a line of six die faces from 1 to 6."""
     die_faces = VGroup(
         *(
-            DieFace(
+            die_face(
                 n,
                 side_length=side_length,
                 corner_radius=corner_radius,
@@ -41,6 +49,90 @@ def get_die_faces(
     return die_faces
 
 
+def independent_dice_spn() -> nx.DiGraph:
+    """Return the SPN of two independent fair dice D_1 and D_2."""
+    g = nx.DiGraph()
+    #           x
+    #       +       +
+    #     1...6   1...6
+    g.add_node(r"\times", kind="product")
+    g.add_node(r"+'", kind="sum")
+    g.add_node(r"+", kind="sum")
+    g.add_edges_from(((r"\times", r"+'"), (r"\times", r"+")))
+    for var, (sum_node, leaf) in enumerate(((r"+'", r"a_"), (r"+", r"b_"))):
+        for i in range(1, 7):
+            g.add_node(leaf + str(i), kind="leaf", var=var, value=i - 1)
+            g.add_edge(sum_node, leaf + str(i), weight=1 / 6)
+    return g
+
+
+def dependent_spn() -> nx.DiGraph:
+    """Return an SPN over three binary variables where x_1 and x_2 depend on x_3."""
+    g = nx.DiGraph()
+    #                           +(s1)
+    #                       x(p1)   x(p2)
+    #       +(s2)   +(s3)   +(s4)   +(s5)
+    #         x1     ~x1     x2      ~x2      x3  ~x3
+    for node in ("s1", "s2", "s3", "s4", "s5"):
+        g.add_node(node, kind="sum")
+    for node in ("p1", "p2"):
+        g.add_node(node, kind="product")
+    for i in range(1, 4):
+        g.add_node(f"x{i}", kind="leaf", var=i - 1, value=1)
+        g.add_node(f"nx{i}", kind="leaf", var=i - 1, value=0)
+    g.add_edges_from(
+        (
+            ("s1", "p1", dict(weight=0.6)),
+            ("s1", "p2", dict(weight=0.4)),
+            ("p1", "s2"),
+            ("p1", "s4"),
+            ("p1", "x3"),
+            ("p2", "s3"),
+            ("p2", "s5"),
+            ("p2", "nx3"),
+            ("s2", "x1", dict(weight=0.9)),
+            ("s2", "nx1", dict(weight=0.1)),
+            ("s3", "x1", dict(weight=0.2)),
+            ("s3", "nx1", dict(weight=0.8)),
+            ("s4", "x2", dict(weight=0.7)),
+            ("s4", "nx2", dict(weight=0.3)),
+            ("s5", "x2", dict(weight=0.4)),
+            ("s5", "nx2", dict(weight=0.6)),
+        )
+    )
+    return g
+
+
+def incomplete_sum_spn() -> nx.DiGraph:
+    """Return a sum node over two different variables, which is not complete.
+
+    ``spn.compile(incomplete_sum_spn()).check()`` raises ValueError.
+    """
+    g = nx.DiGraph()
+    #       +
+    #   x1     x2
+    g.add_node(r"+", kind="sum")
+    for var, leaf in enumerate((r"x_1", r"x_2")):
+        g.add_node(leaf, kind="leaf", var=var, value=1)
+        g.add_edge(r"+", leaf, weight=0.5)
+    return g
+
+
+def inconsistent_product_spn() -> nx.DiGraph:
+    """Return a product node over x_1 and not(x_1), which is not decomposable.
+
+    ``spn.compile(inconsistent_product_spn()).check()`` raises ValueError.
+    """
+    g = nx.DiGraph()
+    #       x
+    #   x1     ~x1
+    g.add_node(r"x", kind="product")
+    g.add_node(r"x1", kind="leaf", var=0, value=1)
+    g.add_node(r"nx1", kind="leaf", var=0, value=0)
+    g.add_edges_from(((r"x", r"x1"), (r"x", r"nx1")))
+    return g
+
+
 class Main(Scene):
     """Robust SPNs animation (Sum-Product Networks).
 
@@ -72,6 +164,22 @@ class Main(Scene):
         3. Imprecise probabilities search space
     """
 
+    sections = ("title", "dices", "sum_product_networks", "uncertainty", "further")
+    # Directory where the scene state is saved at the entry of every section
+    snapshot_dir: str | None = None
+    # Section to start from, its entry state is restored from snapshot_dir
+    resume_from: str | None = None
+    # Fingerprint of the code run before each section, recorded in its snapshot
+    entry_fingerprints: dict[str, str] = {}
+
+    def __init__(self, renderer=None, **kwargs):
+        # Static waits are rasterized once and held, see writer.HeldFrameRenderer
+        if renderer is None and config.renderer == RendererType.CAIRO:
+            renderer = writer.renderer(
+                skip_animations=kwargs.get("skip_animations", False)
+            )
+        super().__init__(renderer=renderer, **kwargs)
+
     def fade_in_out(self, mobject, delay=1, **kwargs):
         """Fade in, wait for delay, fade out."""
         self.play(FadeIn(mobject), **kwargs)
@@ -79,25 +187,48 @@ class Main(Scene):
         self.play(FadeOut(mobject))
 
     def construct(self):
-        """Call sub-sequences."""
-        self.title()
-        self.next_section()
-        self.dices()
-        self.next_section()
-        self.sum_product_networks()
-        self.next_section()
-        self.uncertainty()
-        self.next_section()
-        par = Paragraph(
-            "For the next section, pause the video "
-            "if you wish to think about the answer first",
-            font_size=DEFAULT_FONT_SIZE * 0.5,
-        )
-        self.play(FadeIn(par))
-        self.wait(2)
-        self.play(FadeOut(par))
-        self.further()
-        self.wait(2)
+        """Call sub-sequences, one section each.
+
+        With resume_from, the scene starts from the snapshot taken at the
+        entry of that section. Without a valid snapshot, the sections of Main
+        before it are replayed with their animations skipped.
+        """
+        sections, replay = self.sections, ()
+        if self.resume_from:
+            sections = sections[sections.index(self.resume_from) :]
+            entry = self.load_entry(self.resume_from)
+            if entry is None:
+                logger.info(f"No snapshot of section {self.resume_from}, replaying")
+                replay = Main.sections[: Main.sections.index(self.resume_from)]
+            else:
+                self.add(*entry)
+        for i, name in enumerate(replay + sections):
+            # The first section replaces the empty one manim autocreates
+            self.next_section(name, skip_animations=i < len(replay))
+            if self.snapshot_dir and (i or replay or not self.resume_from):
+                snapshot.save(
+                    self.mobjects,
+                    self.snapshot_path(name),
+                    self.entry_fingerprints.get(name),
+                )
+            getattr(self, name)()
+
+    def snapshot_path(self, name: str) -> Path:
+        """Return the path of the snapshot taken at the entry of section `name`."""
+        return Path(self.snapshot_dir) / f"{name}.npz"
+
+    def load_entry(self, name: str) -> list[Mobject] | None:
+        """Return the mobjects saved at the entry of section `name`, if valid.
+
+        Snapshots recorded with another fingerprint than
+        ``entry_fingerprints[name]`` come from older code and are ignored.
+        """
+        if not self.snapshot_dir or not self.snapshot_path(name).exists():
+            return None
+        expected = self.entry_fingerprints.get(name)
+        if expected and snapshot.fingerprint(self.snapshot_path(name)) != expected:
+            return None
+        return snapshot.load(self.snapshot_path(name))
 
     def title(self):
         """Title sequence."""
@@ -213,7 +344,10 @@ class Main(Scene):
             [[MathTex(r"\frac16\times\frac16") for _ in range(6)] for _ in range(6)]
         )
         joint_dist_table_136 = self.dice_joint_table(
-            [[MathTex(r"\frac{1}{36}") for _ in range(6)] for _ in range(6)]
+            [
+                [MathTex(rf"\frac{{1}}{{{round(1 / p)}}}") for p in row]
+                for row in FactorizedJoint.dice(2).table((0, 1))
+            ]
         )
         joint_dist_table_ab_1 = self.dice_joint_table(
             [
@@ -251,7 +385,7 @@ class Main(Scene):
             font_size=DEFAULT_FONT_SIZE * 0.45,
         )
         space_complexity_equations = [
-            MathTex(f"6^{{{i}}}={6 ** i:,}") for i in range(1, 11)
+            MathTex(f"6^{{{i}}}={FactorizedJoint.dice(i).size:,}") for i in range(1, 11)
         ]
 
         # Time complexity
@@ -594,6 +728,10 @@ class Main(Scene):
         )
         t1 = VGroup(t1a, t1b, t1c)
         graph = self.computational_graph_independent()
+        dice = spn.compile(independent_dice_spn())
+        # Leaf indicators for the evidence D_1=2, then D_1=6, D_2=6
+        leaves_2 = dict(zip(dice.names, dice.forward([[1, -1]])[0]))
+        leaves_6_6 = dict(zip(dice.names, dice.forward([[5, 5]])[0]))
         t2a = MarkupText(
             f"A probability distribution is the "
             f"<span fgcolor='{BLUE_B}'>sum</span>-<span fgcolor='{RED_B}'>product</span> "
@@ -624,7 +762,7 @@ class Main(Scene):
                 dot_color=BLUE_B,
             ),
             MathTex(r")"),
-            MathTex(r"\times 1", color=RED_B),
+            MathTex(rf"\times {leaves_2['a_2']:g}", color=RED_B),
             MathTex(r"+", color=BLUE_B),  # 8
             MathTex(r"\mathbb{P}(D_1="),
             *get_die_faces(
@@ -634,7 +772,7 @@ class Main(Scene):
                 dot_color=BLUE_B,
             ),
             MathTex(r")"),
-            MathTex(r"\times 0", color=RED_B),
+            MathTex(rf"\times {leaves_2['a_4']:g}", color=RED_B),
         )
         sum_product_6_6 = VGroup(
             MathTex(r"\mathbb{P}("),
@@ -655,11 +793,11 @@ class Main(Scene):
             MathTex(r")="),
             MathTex(r"\mathbb{P}(D_1="),
             *get_die_faces([6], side_length=0.5, dot_radius=0.04),
-            MathTex(r")\times 1"),
+            MathTex(rf")\times {leaves_6_6['a_6']:g}"),
             MathTex(r"\times", color=RED_B),
             MathTex(r"\mathbb{P}(D_2="),
             *get_die_faces([6], side_length=0.5, dot_radius=0.04),
-            MathTex(r")\times 1"),
+            MathTex(rf")\times {leaves_6_6['b_6']:g}"),
         )
 
         # Complexity
@@ -729,38 +867,26 @@ class Main(Scene):
         # Joint distribution
         t2b.to_edge(UP)
         graph.next_to(t2b, DOWN)
+        forward_6_6, values_6_6 = diagram.forward_pass(dice, [5, 5], graph)
         sum_product_6_6.arrange_submobjects()
         sum_product_6_6.next_to(graph, DOWN)
         sum_product_6_6.scale(scale_factor=0.9)
         self.wait(1)
 
+        # One animation per layer of the network: leaves, sums, product
+        leaves, sums, product = forward_6_6
         self.play(FadeIn(t2b))
-        self.play(
-            FadeIn(sum_product_6_6[0:6]),
-            graph.vertices[r"a_6"].animate.set_color(BLUE_B),
-            graph.vertices[r"b_6"].animate.set_color(BLUE_B),
-        )
+        self.play(FadeIn(sum_product_6_6[0:6]), leaves)
         self.wait(1)
 
-        self.play(
-            graph.edges[(r"+'", r"a_6")].animate.set_color(BLUE_B),
-            FadeIn(sum_product_6_6[6:9]),
-        )
-        self.wait(1)
-
-        self.play(
-            graph.edges[(r"+", r"b_6")].animate.set_color(BLUE_B),
-            FadeIn(sum_product_6_6[10:]),
-        )
+        self.play(FadeIn(sum_product_6_6[6:9]), FadeIn(sum_product_6_6[10:]), sums)
         self.wait(1)
 
+        self.play(FadeIn(sum_product_6_6[9]), product)
+        self.wait(5)
         self.play(
-            FadeIn(sum_product_6_6[9]),
-            graph.edges[(r"\times", r"+'")].animate.set_color(RED_B),
-            graph.edges[(r"\times", r"+")].animate.set_color(RED_B),
+            FadeOut(t2b), Uncreate(graph), FadeOut(sum_product_6_6), FadeOut(values_6_6)
         )
-        self.wait(5)
-        self.play(FadeOut(t2b), Uncreate(graph), FadeOut(sum_product_6_6))
 
         # Complexity
         t3a.to_edge(UP)
@@ -997,6 +1123,11 @@ class Main(Scene):
             3. Imprecise probabilities search space
             4. Learning SPNs
         """
+        par = Paragraph(
+            "For the next section, pause the video "
+            "if you wish to think about the answer first",
+            font_size=DEFAULT_FONT_SIZE * 0.5,
+        )
         t1a = Paragraph(
             f"Over the course of this video, we have skipped essential concepts\n"
             f"for the sake of clarity.",
@@ -1054,6 +1185,10 @@ class Main(Scene):
         t3 = VGroup(t3a, t3b)
 
         ## --- Animation ---- ##
+        self.play(FadeIn(par))
+        self.wait(2)
+        self.play(FadeOut(par))
+
         t1.arrange(DOWN)
         t1.to_edge(UP)
         graph_dependent.scale_to_fit_width(8)
@@ -1092,44 +1227,37 @@ class Main(Scene):
         for t in t3[1:]:
             self.play(FadeIn(t))
             self.wait(1)
-        self.wait(3)
+        self.wait(5)
 
     def incomplete_sum_graph(self, vertex_spacing=(1, 1.5)):
-        g = nx.Graph()
-        #       +
-        #   x1     x2
-        g.add_edges_from(
-            (
-                (r"+", r"x_1"),
-                (r"+", r"x_2"),
-            )
-        )
+        g = incomplete_sum_spn()
         graph = Graph(
             vertices=list(g.nodes),
             edges=list(g.edges),
-            layout="tree",
+            layout=layouts.layout(
+                list(g.nodes),
+                list(g.edges),
+                "tree",
+                root_vertex=r"+",
+                layout_config=dict(vertex_spacing=vertex_spacing),
+            ),
             root_vertex=r"+",
             labels=True,
-            layout_config=dict(
-                vertex_spacing=vertex_spacing,
-            ),
         )
         return graph
 
     def inconsistent_product_graph(self, vertex_spacing=(1, 1.5)):
-        g = nx.Graph()
-        #       x
-        #   x1     ~x1
-        g.add_edges_from(
-            (
-                (r"x", r"x1"),
-                (r"x", r"nx1"),
-            )
-        )
+        g = inconsistent_product_spn()
         graph = Graph(
             vertices=list(g.nodes),
             edges=list(g.edges),
-            layout="tree",
+            layout=layouts.layout(
+                list(g.nodes),
+                list(g.edges),
+                "tree",
+                root_vertex="x",
+                layout_config=dict(vertex_spacing=vertex_spacing),
+            ),
             labels={
                 "x": MathTex(r"\times").set_color(BLACK),
                 "x1": MathTex(r"x_1").set_color(BLACK),
@@ -1138,83 +1266,35 @@ class Main(Scene):
                 ).set_color(BLACK),
             },
             root_vertex="x",
-            layout_config=dict(
-                vertex_spacing=vertex_spacing,
-            ),
         )
         return graph
 
     def computational_graph_independent(self, vertex_spacing=(1, 1.5)):
-        g = nx.Graph()
-        #           x
-        #       +       +
-        #     1...6   1...6
-        g.add_edges_from(
-            (
-                (r"\times", r"+'"),
-                (r"\times", r"+"),
-                *((r"+'", r"a_" + str(i)) for i in range(1, 7)),
-                *((r"+", r"b_" + str(i)) for i in range(1, 7)),
-            )
-        )
+        g = independent_dice_spn()
         graph = Graph(
             vertices=list(g.nodes),
             edges=list(g.edges),
-            layout="tree",
-            layout_scale=5,
+            layout=layouts.layout(
+                list(g.nodes),
+                list(g.edges),
+                "tree",
+                root_vertex=r"\times",
+                layout_scale=5,
+                layout_config=dict(vertex_spacing=vertex_spacing),
+            ),
             root_vertex=r"\times",
             labels=True,
-            layout_config=dict(
-                vertex_spacing=vertex_spacing,
-            ),
         )
         return graph
 
     def computational_graph_dependent(self):
-        g = nx.Graph()
-        #                           +(s1)
-        #                       x(p1)   x(p2)
-        #       +(s2)   +(s3)   +(s4)   +(s5)
-        #         x1     ~x1     x2      ~x2      x3  ~x3
-        g.add_edges_from(
-            (
-                ("s1", "p1"),
-                ("s1", "p2"),
-                ("p1", "s2"),
-                ("p1", "s4"),
-                ("p1", "x3"),
-                ("p2", "s3"),
-                ("p2", "s5"),
-                ("p2", "nx3"),
-                ("s2", "x1"),
-                ("s2", "nx1"),
-                ("s3", "x1"),
-                ("s3", "nx1"),
-                ("s4", "x2"),
-                ("s4", "nx2"),
-                ("s5", "x2"),
-                ("s5", "nx2"),
-            )
-        )
-        pos = {
-            "s1": (3, 3, 0),
-            "p1": (2, 2, 0),
-            "p2": (4, 2, 0),
-            "s2": (-1, 1, 0),
-            "s3": (1, 1, 0),
-            "s4": (2, 1, 0),
-            "s5": (4, 1, 0),
-            "x1": (-1, 0, 0),
-            "nx1": (1, 0, 0),
-            "x2": (2, 0, 0),
-            "nx2": (4, 0, 0),
-            "x3": (6, 0, 0),
-            "nx3": (8, 0, 0),
-        }
+        g = dependent_spn()
         graph = Graph(
             vertices=list(g.nodes),
             edges=list(g.edges),
-            layout=pos,
+            layout=layouts.layout(
+                list(g.nodes), list(g.edges), "layered", root_vertex="s1"
+            ),
             root_vertex="s1",
             labels={
                 **{f"s{i}": MathTex(r"+").set_color(BLACK) for i in range(1, 6)},
@@ -0,0 +1,278 @@
+"""pointstore.py - Persistent on-disk cache of mobject point arrays.
+
+Entries are keyed by the sha256 of their cache key and stored as two files:
+``<digest>.npy`` with the point arrays of the whole mobject family
+concatenated, and ``<digest>.json`` with the class, submobjects and plain
+attributes (styles, strings, numbers, TeX templates) of every family member.
+Attributes may refer to other mobjects, e.g. ``Paragraph.lines``; these are
+stored as members too. Nothing in the store is unpickled or executed: classes
+are looked up among the imported subclasses of ``Mobject``, and attributes
+that are not plain data (updaters) are left to their defaults. Point arrays
+are loaded through a copy-on-write memory map, so entries are shared with the
+page cache until an animation mutates them.
+
+The store lives in ``$AOS4_POINT_CACHE`` (default: ``<media_dir>/point_cache``)
+and can be put on a shared mount. Each manim version and store format gets
+its own subdirectory, and the least recently used entries are evicted once
+the store grows beyond ``$AOS4_POINT_CACHE_BYTES`` (default: 1 GiB).
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+from enum import Enum
+from pathlib import Path
+from typing import Callable
+
+import manim
+import numpy as np
+from colour import Color
+from manim import Mobject, TexTemplate, VMobject, config
+
+VERSION = 3
+
+
+def _encode(value, reference: Callable[[Mobject], int]):
+    """Return `value` as JSON data, or raise TypeError if it is not plain data.
+
+    JSON objects are tagged with the type they stand for. Mobjects are
+    stored as the index that `reference` gives them.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        return {"array": value.tolist(), "dtype": value.dtype.str}
+    if isinstance(value, Color):
+        return {"color": value.hex_l}
+    if isinstance(value, Enum) and getattr(manim, type(value).__name__, None) is type(
+        value
+    ):
+        return {"enum": type(value).__name__, "name": value.name}
+    if isinstance(value, Mobject):
+        return {"member": reference(value)}
+    if type(value) is TexTemplate:
+        return {"tex_template": _encode(vars(value), reference)}
+    if isinstance(value, list):
+        return [_encode(v, reference) for v in value]
+    if isinstance(value, tuple):
+        return {"tuple": [_encode(v, reference) for v in value]}
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return {"dict": {k: _encode(v, reference) for k, v in value.items()}}
+    raise TypeError(f"{type(value).__name__} is not plain data")
+
+
+def _decode(data, members: list[Mobject]):
+    """Inverse of :func:`_encode`, with `members` the mobjects by index."""
+    if isinstance(data, list):
+        return [_decode(v, members) for v in data]
+    if not isinstance(data, dict):
+        return data
+    if "array" in data:
+        return np.array(data["array"], dtype=np.dtype(data["dtype"]))
+    if "color" in data:
+        return Color(data["color"])
+    if "enum" in data:
+        enum = getattr(manim, data["enum"])
+        if not (isinstance(enum, type) and issubclass(enum, Enum)):
+            raise ValueError(f"{data['enum']} is not a manim enum")
+        return enum[data["name"]]
+    if "member" in data:
+        return members[data["member"]]
+    if "tex_template" in data:
+        template = TexTemplate.__new__(TexTemplate)
+        vars(template).update(_decode(data["tex_template"], members))
+        return template
+    if "tuple" in data:
+        return tuple(_decode(v, members) for v in data["tuple"])
+    return {k: _decode(v, members) for k, v in data["dict"].items()}
+
+
+def _qualified_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _mobject_classes() -> dict[str, type]:
+    """Return the imported subclasses of Mobject by qualified name."""
+    classes, todo = {}, [Mobject]
+    while todo:
+        cls = todo.pop()
+        classes[_qualified_name(cls)] = cls
+        todo += cls.__subclasses__()
+    return classes
+
+
+def split(mobject: Mobject) -> tuple[dict, np.ndarray]:
+    """Return the JSON skeleton of `mobject`, and the concatenated points of its members.
+
+    Members are the family of `mobject`, then the other mobjects that their
+    attributes refer to, e.g. ``Paragraph.lines_text``.
+    """
+    members = list(dict.fromkeys(mobject.get_family()))
+    index = {id(m): i for i, m in enumerate(members)}
+
+    def reference(m: Mobject) -> int:
+        if id(m) not in index:
+            index[id(m)] = len(members)
+            members.append(m)
+        return index[id(m)]
+
+    skeleton = []
+    # Members are appended while the attributes of earlier ones are encoded
+    while len(skeleton) < len(members):
+        m = members[len(skeleton)]
+        attributes = {}
+        for name, value in vars(m).items():
+            if name in ("points", "submobjects"):
+                continue
+            try:
+                attributes[name] = _encode(value, reference)
+            except TypeError:
+                pass  # left to the default of the class
+        skeleton.append(
+            {
+                "class": _qualified_name(type(m)),
+                "points": len(m.points),
+                "submobjects": [reference(s) for s in m.submobjects],
+                "attributes": attributes,
+            }
+        )
+    return {"members": skeleton}, np.concatenate([m.points for m in members])
+
+
+def join(skeleton: dict, points: np.ndarray) -> Mobject:
+    """Inverse of :func:`split`; members get views into `points`.
+
+    Raise ValueError if the skeleton names a class that is not an imported
+    Mobject.
+    """
+    classes = _mobject_classes()
+    # Attributes that are not stored keep the defaults of a bare (V)Mobject
+    defaults: dict[type, dict] = {}
+    members = []
+    for member in skeleton["members"]:
+        cls = classes.get(member["class"])
+        if cls is None:
+            raise ValueError(f"Unknown mobject class {member['class']}")
+        base = VMobject if issubclass(cls, VMobject) else Mobject
+        if base not in defaults:
+            defaults[base] = vars(base())
+        m = cls.__new__(cls)
+        vars(m).update(
+            {
+                name: copy.deepcopy(value)
+                for name, value in defaults[base].items()
+                if name not in member["attributes"]
+            }
+        )
+        members.append(m)
+    offsets = np.cumsum([0, *(member["points"] for member in skeleton["members"])])
+    for m, member, start, stop in zip(
+        members, skeleton["members"], offsets, offsets[1:]
+    ):
+        vars(m).update(
+            {
+                name: _decode(value, members)
+                for name, value in member["attributes"].items()
+            }
+        )
+        m.points = points[start:stop]
+        m.submobjects = [members[i] for i in member["submobjects"]]
+    return members[0]
+
+
+class PointStore:
+    """Content-addressed store of mobjects on disk."""
+
+    def __init__(self, root: str | Path, max_bytes: int = 2**30):
+        self.root = Path(root) / f"v{VERSION}-manim{manim.__version__}"
+        self.max_bytes = max_bytes
+        # Bytes in the store, counted by the first eviction and kept up by save
+        self._bytes: int | None = None
+
+    @classmethod
+    def default(cls) -> PointStore:
+        return cls(
+            os.environ.get("AOS4_POINT_CACHE", Path(config.media_dir) / "point_cache"),
+            int(os.environ.get("AOS4_POINT_CACHE_BYTES", 2**30)),
+        )
+
+    def get(self, key: tuple, build: Callable[[], Mobject]) -> Mobject:
+        """Return the mobject stored under `key`, building and storing it if needed."""
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        mobject = self.load(digest)
+        if mobject is None:
+            mobject = build()
+            self.save(digest, mobject)
+        return mobject
+
+    def load(self, digest: str) -> Mobject | None:
+        skeleton, npy = self.root / f"{digest}.json", self.root / f"{digest}.npy"
+        try:
+            mobject = join(
+                json.loads(skeleton.read_text()), np.load(npy, mmap_mode="c")
+            )
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        try:
+            for path in (skeleton, npy):
+                os.utime(path)
+        except OSError:
+            pass  # read-only store
+        return mobject
+
+    def save(self, digest: str, mobject: Mobject):
+        try:
+            skeleton, points = split(mobject)
+            text = json.dumps(skeleton, allow_nan=False).encode()
+        except (TypeError, ValueError, AttributeError):
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        size = 0
+        # Write to temporary files first so concurrent readers never see a partial entry.
+        for suffix, write in (
+            (".npy", lambda fp: np.save(fp, points)),
+            (".json", lambda fp: fp.write(text)),
+        ):
+            with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as fp:
+                write(fp)
+                size += fp.tell()
+            os.replace(fp.name, self.root / f"{digest}{suffix}")
+        if self._bytes is None or self._bytes + size > self.max_bytes:
+            self.evict()
+        else:
+            self._bytes += size
+
+    def evict(self):
+        """Remove least recently used entries until the store fits in max_bytes.
+
+        This scans the whole store; :meth:`save` only calls it once, then
+        whenever its running count of bytes goes beyond max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".npy"):
+                continue
+            skeleton = self.root / f"{entry.name[:-4]}.json"
+            try:
+                stat = entry.stat()
+                size = stat.st_size + skeleton.stat().st_size
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, size, entry.path, skeleton))
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, *paths in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        self._bytes = total
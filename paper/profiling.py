@@ -0,0 +1,168 @@
+"""profiling.py - Where the render of a scene spends its time.
+
+:func:`instrument` wraps the methods of a scene, its renderer and file
+writer so that every call runs inside a named phase:
+
+    section:<name>             a section of Main, building included
+      play:<i> <animations>    a play call, wait:<i> for waits
+        interpolate            updating mobjects to the animation time
+        rasterize              drawing mobjects with Cairo
+        encode                 writing frames to ffmpeg and closing the pipe
+        hold                   writing a static wait (see writer.HeldFrameRenderer)
+      tex                      compiling TeX to SVG
+
+Phases nest, and each records its calls, wall time, CPU time and peak
+resident set size. On Linux the peak is reset when a phase starts and
+ends (``/proc/self/clear_refs``), so it is the peak while the phase or one
+of its sub-phases ran. Elsewhere it is the high-water mark of the process
+when the phase ended, and can only grow. :meth:`Profiler.write` saves
+them as JSON, and as collapsed stacks of self time in microseconds for
+flame graph tools (flamegraph.pl, speedscope, inferno).
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from manim import Scene, Wait
+from manim.mobject.text import tex_mobject
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the process, in bytes.
+
+    That is the peak since the last :func:`reset_peak_rss` where it works.
+    """
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident set size to the current one; False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class Profiler:
+    """Accumulate wall time, CPU time and peak RSS of nested phases."""
+
+    def __init__(self):
+        self.stack: list[str] = []
+        # Peak RSS of every open phase so far, along the stack
+        self.peaks: list[int] = []
+        self.phases: dict[tuple[str, ...], dict[str, float]] = {}
+
+    def _collect_peak(self):
+        """Fold the peak RSS since the last reset into every open phase, and reset it."""
+        peak = peak_rss()
+        self.peaks = [max(p, peak) for p in self.peaks]
+        reset_peak_rss()
+
+    @contextmanager
+    def phase(self, name: str):
+        self._collect_peak()
+        self.stack.append(name)
+        self.peaks.append(0)
+        path = tuple(self.stack)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._collect_peak()
+            record = self.phases.setdefault(
+                path, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_rss": 0}
+            )
+            record["calls"] += 1
+            record["wall"] += time.perf_counter() - wall
+            record["cpu"] += time.process_time() - cpu
+            record["peak_rss"] = max(record["peak_rss"], self.peaks.pop())
+            self.stack.pop()
+
+    def wrap(self, function, name):
+        """Return `function` running in a phase named by ``name(*args)``, or `name`."""
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(name(*args, **kwargs) if callable(name) else name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def self_times(self) -> dict[tuple[str, ...], float]:
+        """Return the wall time of every phase minus that of its sub-phases."""
+        times = {path: record["wall"] for path, record in self.phases.items()}
+        for path, record in self.phases.items():
+            if path[:-1] in times:
+                times[path[:-1]] -= record["wall"]
+        return times
+
+    def report(self) -> list[dict]:
+        return [
+            {"stack": list(path), **record, "self": self_time}
+            for (path, record), self_time in zip(
+                self.phases.items(), self.self_times().values()
+            )
+        ]
+
+    def write(self, prefix: str | Path):
+        """Write `prefix`.json and the collapsed stacks to `prefix`.folded."""
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        prefix.with_suffix(".json").write_text(json.dumps(self.report(), indent=4))
+        with prefix.with_suffix(".folded").open("w") as fp:
+            for path, self_time in self.self_times().items():
+                stack = ";".join(name.replace(";", ",") for name in path)
+                fp.write(f"{stack} {max(round(self_time * 1e6), 0)}\n")
+
+
+def _play_name(scene: Scene):
+    def name(*args, **kwargs) -> str:
+        i = scene.renderer.num_plays
+        if len(args) == 1 and isinstance(args[0], Wait):
+            return f"wait:{i}"
+        kinds = sorted({type(a).__name__ for a in args})
+        return f"play:{i} {'+'.join(kinds)}"
+
+    return name
+
+
+def instrument(scene: Scene, profiler: Profiler | None = None) -> Profiler:
+    """Record the phases of the render of `scene` in `profiler`, and return it.
+
+    Call after the scene is created and before it is rendered. TeX
+    compilation is recorded for the whole process.
+    """
+    profiler = profiler or Profiler()
+    for name in getattr(scene, "sections", ()):
+        method = getattr(scene, name)
+        setattr(scene, name, profiler.wrap(method, f"section:{name}"))
+    scene.play = profiler.wrap(scene.play, _play_name(scene))
+    scene.update_to_time = profiler.wrap(scene.update_to_time, "interpolate")
+    renderer = scene.renderer
+    renderer.update_frame = profiler.wrap(renderer.update_frame, "rasterize")
+    renderer.freeze_current_frame = profiler.wrap(renderer.freeze_current_frame, "hold")
+    file_writer = renderer.file_writer
+    file_writer.write_frame = profiler.wrap(file_writer.write_frame, "encode")
+    file_writer.close_movie_pipe = profiler.wrap(file_writer.close_movie_pipe, "encode")
+    tex_to_svg_file = getattr(
+        tex_mobject.tex_to_svg_file, "__wrapped__", tex_mobject.tex_to_svg_file
+    )
+    tex_mobject.tex_to_svg_file = profiler.wrap(tex_to_svg_file, "tex")
+    return profiler
@@ -0,0 +1,457 @@
+"""render.py - Render Main's sections in parallel or incrementally.
+
+Each section of :class:`main.Main` is rendered as an independent scene on a
+process pool, then the partial movies are concatenated without re-encoding.
+
+    python render.py --jobs 5
+
+The scene state is saved at the entry of every section, with a fingerprint
+of the code that produced it. A worker restores it instead of replaying
+earlier sections, and a preview can start directly from a section. When
+there is no snapshot for the current code, earlier sections are replayed
+with their animations skipped:
+
+    python render.py --from uncertainty
+
+With ``--incremental``, every section is fingerprinted from its code and the
+scene state at its entry. Sections whose fingerprint did not change since the
+last incremental render are not run at all: their movie is reused and their
+end state is restored from a snapshot. Only changed sections are re-rendered.
+
+    python render.py --incremental
+
+With ``--stream``, every section is encoded as one continuous stream
+instead of one partial movie per animation (see :mod:`writer`).
+
+Sections are rendered at a quality tier (see :data:`TIERS`), for the whole
+movie or per section. Tiers only change the resolution and frame rate:
+text, die faces, layouts and snapshots are cached independently of them,
+so going from draft to final only pays for rasterization and encoding.
+
+    python render.py --quality draft --quality uncertainty=final
+
+With ``--profile DIRECTORY``, the time spent in every section, animation and
+render phase is written to DIRECTORY (see :mod:`profiling`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import ModuleType
+
+from manim import Mobject, config, tempconfig
+
+import main as main_module
+import profiling
+import snapshot
+import writer
+from main import Main
+
+SNAPSHOT_DIR = Path(config.media_dir) / "sections"
+# Exit states of incremental renders, named by their digest
+STATE_DIR = SNAPSHOT_DIR / "states"
+
+# Quality tiers, as config overrides
+TIERS = {
+    "draft": {"pixel_width": 854, "pixel_height": 480, "frame_rate": 15},
+    "review": {"pixel_width": 1280, "pixel_height": 720, "frame_rate": 30},
+    "final": {"pixel_width": 1920, "pixel_height": 1080, "frame_rate": 60},
+}
+
+
+class SectionScene(Main):
+    """Main restricted to some sections.
+
+    With state_dir, the scene resumes from the state of digest entry_state
+    and saves its end state there, as ``state_digest``.
+    """
+
+    sections = ()
+    snapshot_dir = str(SNAPSHOT_DIR)
+    state_dir: str | None = None
+    entry_state: str | None = None
+
+    def load_entry(self, name: str) -> list[Mobject] | None:
+        if self.state_dir and self.entry_state:
+            path = Path(self.state_dir) / f"{self.entry_state}.npz"
+            return snapshot.load(path) if path.exists() else None
+        return super().load_entry(name)
+
+    def tear_down(self):
+        if self.state_dir:
+            self.state_digest = snapshot.save_state(self.mobjects, self.state_dir)
+
+
+def section_scene(name: str, **attributes) -> type[SectionScene]:
+    """Return a scene whose construct only plays the section `name`.
+
+    The scene resumes from the snapshot taken at the entry of the section
+    if it matches the current code, and replays the sections before it
+    otherwise.
+    """
+    if name != Main.sections[0]:
+        attributes.setdefault("resume_from", name)
+    attributes.setdefault("entry_fingerprints", entry_fingerprints())
+    return type(f"Main_{name}", (SectionScene,), {"sections": (name,), **attributes})
+
+
+def run_scene(
+    cls: type[Main], stream: bool = False, profile: str | Path | None = None
+) -> Main:
+    """Render a new `cls` scene and return it.
+
+    With `stream`, each section is encoded as one stream. With `profile`,
+    the timings of the render are written to `profile`/<scene name>.json and
+    .folded (see :mod:`profiling`).
+    """
+    if stream:
+        config.disable_caching = True
+        scene = cls(renderer=writer.renderer(stream=True))
+    else:
+        scene = cls()
+    profiler = profiling.instrument(scene) if profile else None
+    scene.render()
+    if profiler:
+        profiler.write(Path(profile) / cls.__name__)
+    return scene
+
+
+def render_section(
+    name: str,
+    overrides: dict | None = None,
+    stream: bool = False,
+    profile: str | None = None,
+    **attributes,
+) -> str:
+    """Render a single section and return the path of its movie file."""
+    with tempconfig(overrides or {}):
+        scene = run_scene(section_scene(name, **attributes), stream, profile)
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def concat(movies: list[str], output: str | Path):
+    """Concatenate movie files into `output` without re-encoding."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as fp:
+        for movie in movies:
+            fp.write(f"file 'file:{Path(movie).as_posix()}'\n")
+    try:
+        subprocess.run(
+            [
+                config.ffmpeg_executable,
+                "-y",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                fp.name,
+                "-loglevel",
+                config.ffmpeg_loglevel.lower(),
+                "-nostdin",
+                "-c",
+                "copy",
+                "-an",
+                str(output),
+            ],
+            check=True,
+        )
+    finally:
+        os.remove(fp.name)
+
+
+def tiers_of(sections: tuple[str, ...], quality: str | dict[str, str]) -> list[str]:
+    """Return the tier of each section, given one tier or a tier per section."""
+    tiers = [
+        quality if isinstance(quality, str) else quality.get(name, "final")
+        for name in sections
+    ]
+    for tier in tiers:
+        if tier not in TIERS:
+            raise ValueError(
+                f"Unknown quality tier {tier!r}, expected one of {list(TIERS)}"
+            )
+    return tiers
+
+
+def render_sections(
+    sections: tuple[str, ...] = Main.sections,
+    quality: str | dict[str, str] = "final",
+    jobs: int | None = None,
+    stream: bool = False,
+    profile: str | None = None,
+) -> list[str]:
+    """Render `sections` on a process pool and return their movie files."""
+    overrides = [
+        {"progress_bar": "none", **TIERS[t]} for t in tiers_of(sections, quality)
+    ]
+    n = len(sections)
+    with ProcessPoolExecutor(max_workers=jobs or n) as pool:
+        return list(
+            pool.map(render_section, sections, overrides, [stream] * n, [profile] * n)
+        )
+
+
+def render_parallel(
+    output: str | Path,
+    sections: tuple[str, ...] = Main.sections,
+    jobs: int | None = None,
+    stream: bool = False,
+    quality: str = "final",
+    profile: str | None = None,
+) -> Path:
+    """Render `sections` on a process pool and concatenate them into `output`."""
+    movies = render_sections(sections, quality, jobs, stream, profile)
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    concat(movies, output)
+    return output
+
+
+def local_modules(module: ModuleType) -> dict[str, ModuleType]:
+    """Return the modules of this directory that `module` depends on, itself included.
+
+    Dependencies are found through the module globals: imported modules, and
+    the modules defining imported functions and classes (``from X import
+    name``), recursively.
+    """
+    here = Path(__file__).resolve().parent
+    found, todo = {}, [module]
+    while todo:
+        module = todo.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        for value in vars(module).values():
+            if inspect.ismodule(value):
+                name = value.__name__
+            elif inspect.isfunction(value):
+                # Not __module__, which functools.wraps copies from the wrapped class
+                name = value.__globals__.get("__name__")
+            else:
+                name = getattr(value, "__module__", None)
+            dependency = sys.modules.get(name) if isinstance(name, str) else None
+            path = getattr(dependency, "__file__", None)
+            if path and Path(path).resolve().parent == here:
+                todo.append(dependency)
+    return found
+
+
+def code_fingerprint(name: str) -> str:
+    """Hash the code a section depends on.
+
+    That is the section method, the rest of main.py without the other
+    sections, and every local module main.py depends on (see
+    :func:`local_modules`).
+    """
+    source = inspect.getsource(main_module)
+    for other in Main.sections:
+        if other != name:
+            source = source.replace(inspect.getsource(getattr(Main, other)), "")
+    digest = hashlib.sha256(source.encode())
+    modules = local_modules(main_module)
+    for module_name in sorted(set(modules) - {main_module.__name__}):
+        digest.update(inspect.getsource(modules[module_name]).encode())
+    return digest.hexdigest()
+
+
+def entry_fingerprints() -> dict[str, str]:
+    """Return the fingerprint of the code run before each section of Main."""
+    digest, fingerprints = hashlib.sha256(), {}
+    for name in Main.sections:
+        fingerprints[name] = digest.hexdigest()
+        digest.update(code_fingerprint(name).encode())
+    return fingerprints
+
+
+def render_incremental(
+    output: str | Path,
+    sections: tuple[str, ...] = Main.sections,
+    stream: bool = False,
+    quality: str = "final",
+    profile: str | None = None,
+) -> Path:
+    """Re-render only the sections whose code or entry state changed.
+
+    Each tier keeps its own movies and manifest. Exit states are snapshots
+    named by their digest in STATE_DIR, shared by all tiers: a section
+    resumes from exactly the state its manifest records for the previous
+    section, whatever other renders wrote since.
+    """
+    tiers_of(sections, quality)
+    manifest_path = SNAPSHOT_DIR / f"manifest-{quality}.json"
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        manifest = {}
+
+    movies = []
+    entry_state = ""
+    for name in sections:
+        fingerprint = hashlib.sha256(
+            (code_fingerprint(name) + entry_state).encode()
+        ).hexdigest()
+        record = manifest.get(name, {})
+        if (
+            record.get("fingerprint") != fingerprint
+            or not Path(record.get("movie", "")).exists()
+            or not (STATE_DIR / f"{record.get('state')}.npz").exists()
+        ):
+            with tempconfig(TIERS[quality]):
+                scene = run_scene(
+                    section_scene(
+                        name, state_dir=str(STATE_DIR), entry_state=entry_state or None
+                    ),
+                    stream,
+                    profile,
+                )
+            record = manifest[name] = {
+                "fingerprint": fingerprint,
+                "movie": str(scene.renderer.file_writer.movie_file_path),
+                "state": scene.state_digest,
+            }
+            manifest_path.write_text(json.dumps(manifest, indent=4))
+        movies.append(record["movie"])
+        entry_state = record["state"]
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    concat(movies, output)
+    return output
+
+
+def render_from(
+    name: str,
+    stream: bool = False,
+    quality: str = "draft",
+    profile: str | None = None,
+) -> str:
+    """Render Main from section `name` on, restoring the state at its entry.
+
+    Without a snapshot of that state for the current code, the sections
+    before `name` are replayed without rendering them.
+    """
+    tiers_of((name,), quality)
+    with tempconfig(TIERS[quality]):
+        scene = run_scene(
+            type(
+                f"Main_from_{name}",
+                (Main,),
+                {
+                    "resume_from": name,
+                    "snapshot_dir": str(SNAPSHOT_DIR),
+                    "entry_fingerprints": entry_fingerprints(),
+                },
+            ),
+            stream,
+            profile,
+        )
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def parse_quality(values: list[str]) -> str | dict[str, str] | None:
+    """Parse ``--quality`` values: TIER for every section, or SECTION=TIER."""
+    default, tiers = None, {}
+    for value in values:
+        name, _, tier = value.rpartition("=")
+        if name and name not in Main.sections:
+            raise ValueError(f"Unknown section {name!r}")
+        if name:
+            tiers[name] = tier
+        else:
+            default = tier
+    if not tiers:
+        return default
+    return {name: tiers.get(name, default or "final") for name in Main.sections}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per section)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="path of the concatenated movie (default: Main[_TIER] in the media directory)",
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        action="append",
+        default=[],
+        metavar="[SECTION=]TIER",
+        help=f"quality tier, one of {', '.join(TIERS)}, for all sections or one "
+        "section (default: final, draft with --from)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-render sections that changed since the last incremental render",
+    )
+    parser.add_argument(
+        "--from",
+        dest="section",
+        choices=Main.sections,
+        help="render from this section on, restoring the scene state at its entry",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="encode each section as one stream instead of one file per animation",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIRECTORY",
+        help="write the timings of every rendered scene to DIRECTORY (see profiling.py)",
+    )
+    args = parser.parse_args()
+    quality = parse_quality(args.quality)
+    if isinstance(quality, dict) and (args.section or args.incremental):
+        parser.error("per section tiers only apply to parallel renders")
+    if args.section:
+        print(render_from(args.section, args.stream, quality or "draft", args.profile))
+        return
+    quality = quality or "final"
+    if isinstance(quality, dict) and len(set(quality.values())) > 1:
+        # Movies of different resolutions cannot be concatenated
+        for movie in render_sections(
+            Main.sections, quality, args.jobs, args.stream, args.profile
+        ):
+            print(movie)
+        return
+    if isinstance(quality, dict):
+        quality = next(iter(quality.values()))
+    output = args.output or Path(config.media_dir) / (
+        ("Main" if quality == "final" else f"Main_{quality}")
+        + config.movie_file_extension
+    )
+    if args.incremental:
+        print(
+            render_incremental(
+                output, Main.sections, args.stream, quality, args.profile
+            )
+        )
+    else:
+        print(
+            render_parallel(
+                output, Main.sections, args.jobs, args.stream, quality, args.profile
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""snapshot.py - Save and restore the mobjects of a scene.
+
+A snapshot is a single compressed .npz blob holding the JSON skeleton of the
+mobject tree (see :func:`pointstore.split`) and every point array of the
+tree concatenated into one float array. A snapshot can also record the
+fingerprint of the code that produced it, so that readers can ignore
+snapshots of older code.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from manim import Group, Mobject
+
+from pointstore import join, split
+
+
+def dumps(mobjects: list[Mobject], fingerprint: str | None = None) -> tuple[bytes, str]:
+    """Return the snapshot blob of `mobjects` and the sha256 of its content."""
+    skeleton, points = split(Group(*mobjects))
+    skeleton = json.dumps(skeleton, allow_nan=False).encode()
+    arrays = {"skeleton": np.frombuffer(skeleton, dtype=np.uint8), "points": points}
+    if fingerprint is not None:
+        arrays["fingerprint"] = np.array(fingerprint)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    # The zip archive is timestamped, so hash its content instead.
+    digest = hashlib.sha256(skeleton)
+    digest.update(np.ascontiguousarray(points).tobytes())
+    return buffer.getvalue(), digest.hexdigest()
+
+
+def loads(data: bytes) -> list[Mobject]:
+    with np.load(io.BytesIO(data)) as blob:
+        skeleton = json.loads(blob["skeleton"].tobytes())
+        return join(skeleton, blob["points"]).submobjects
+
+
+def save(
+    mobjects: list[Mobject], path: str | Path, fingerprint: str | None = None
+) -> str:
+    """Write a snapshot of `mobjects` to `path` and return its sha256."""
+    data, digest = dumps(mobjects, fingerprint)
+    _write(data, Path(path))
+    return digest
+
+
+def save_state(mobjects: list[Mobject], directory: str | Path) -> str:
+    """Write a snapshot of `mobjects` to `directory`/<sha256>.npz and return its sha256.
+
+    Snapshots named by their content are never overwritten with another
+    state, so they can be shared by renders of different code or quality.
+    """
+    data, digest = dumps(mobjects)
+    path = Path(directory) / f"{digest}.npz"
+    if not path.exists():
+        _write(data, path)
+    return digest
+
+
+def _write(data: bytes, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as fp:
+        fp.write(data)
+    os.replace(fp.name, path)
+
+
+def load(path: str | Path) -> list[Mobject]:
+    return loads(Path(path).read_bytes())
+
+
+def fingerprint(path: str | Path) -> str | None:
+    """Return the fingerprint recorded in the snapshot at `path`, if any."""
+    try:
+        with np.load(path) as blob:
+            return str(blob["fingerprint"]) if "fingerprint" in blob else None
+    except (OSError, ValueError):
+        return None
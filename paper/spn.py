@@ -0,0 +1,451 @@
+"""spn.py - Sum-product networks compiled to flat arrays.
+
+A network is described by a directed networkx graph whose nodes carry a
+``kind`` attribute ("sum", "product" or "leaf"). Leaves are indicators of
+``var == value`` and edges out of sum nodes carry a ``weight``.
+
+:func:`compile` orders the nodes by height (leaves first, root last) and
+stores the children of every node as a CSR index array. Nodes of the same
+height only depend on lower layers, so a whole layer is evaluated with a
+single ``reduceat`` over its children, for a whole batch of queries at once.
+
+Evidence is an (N, V) integer array, where -1 marks a variable that is
+summed out. With ``log=True`` the network is evaluated in the log domain:
+products add log values and sums use a log-sum-exp shifted by the largest
+child of each node, so deep networks over many variables do not underflow.
+
+:meth:`SPN.mpe` answers most probable explanation queries with the same
+layered passes: a max-product forward pass, then a traceback from the root
+for the whole batch. :meth:`SPN.sample` draws samples with the same
+top-down pass, choosing the children of sum nodes at random.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator
+
+import networkx as nx
+import numpy as np
+
+SUM, PRODUCT, LEAF = 0, 1, 2
+KINDS = {"sum": SUM, "product": PRODUCT, "leaf": LEAF}
+
+
+class SPN:
+    """Sum-product network as a topologically ordered array program.
+
+    Node ``i`` has kind ``kind[i]`` and children
+    ``child_idx[child_ptr[i]:child_ptr[i + 1]]`` with the matching
+    ``weights`` (1 for children of product nodes). Leaves come first and
+    the root is the last node.
+    """
+
+    def __init__(
+        self,
+        kind: np.ndarray,
+        var: np.ndarray,
+        value: np.ndarray,
+        child_ptr: np.ndarray,
+        child_idx: np.ndarray,
+        weights: np.ndarray,
+        names: list | None = None,
+    ):
+        self.kind = kind
+        self.var = var
+        self.value = value
+        self.child_ptr = child_ptr
+        self.child_idx = child_idx
+        self.weights = weights
+        with np.errstate(divide="ignore"):
+            self.log_weights = np.log(weights)
+        self.names = names
+        self.n_leaves = int(np.count_nonzero(kind == LEAF))
+        self.n_vars = int(var.max()) + 1
+        self.cardinality = np.zeros(self.n_vars, dtype=int)
+        np.maximum.at(
+            self.cardinality, var[: self.n_leaves], value[: self.n_leaves] + 1
+        )
+        self.layers = self._layers()
+        # Index in layers of every node, len(layers) for leaves
+        self.layer_of = np.full(len(kind), len(self.layers))
+        for i, (_, start, stop) in enumerate(self.layers):
+            self.layer_of[start:stop] = i
+
+    def __len__(self):
+        return len(self.kind)
+
+    @property
+    def root(self) -> int:
+        return len(self.kind) - 1
+
+    def _layers(self) -> list[tuple[int, int, int]]:
+        """Split inner nodes into contiguous runs of (kind, start, stop) of equal height."""
+        height = np.zeros(len(self), dtype=int)
+        for i in range(self.n_leaves, len(self)):
+            children = self.child_idx[self.child_ptr[i] : self.child_ptr[i + 1]]
+            height[i] = height[children].max() + 1
+        layers = []
+        start = self.n_leaves
+        for i in range(self.n_leaves + 1, len(self) + 1):
+            if (
+                i == len(self)
+                or height[i] != height[start]
+                or self.kind[i] != self.kind[start]
+            ):
+                layers.append((int(self.kind[start]), start, i))
+                start = i
+        return layers
+
+    def segments(self, start: int, stop: int) -> tuple[slice, np.ndarray]:
+        """Return the edge slice of nodes start:stop and the offsets of each node in it."""
+        first = self.child_ptr[start]
+        return (
+            slice(first, self.child_ptr[stop]),
+            self.child_ptr[start:stop] - first,
+        )
+
+    def counts(self, start: int, stop: int) -> np.ndarray:
+        """Return the number of children of nodes start:stop."""
+        return np.diff(self.child_ptr[start : stop + 1])
+
+    def leaves(self, evidence: np.ndarray) -> np.ndarray:
+        """Return the (N, n_leaves) indicator values for the evidence."""
+        observed = evidence[:, self.var[: self.n_leaves]]
+        return (observed == self.value[: self.n_leaves]) | (observed < 0)
+
+    def forward(self, evidence: np.ndarray, log: bool = False) -> np.ndarray:
+        """Return the (N, n_nodes) value of every node for each evidence row."""
+        evidence = np.atleast_2d(evidence)
+        values = np.empty((len(evidence), len(self)))
+        if log:
+            values[:, : self.n_leaves] = np.where(self.leaves(evidence), 0.0, -np.inf)
+        else:
+            values[:, : self.n_leaves] = self.leaves(evidence)
+        for kind, start, stop in self.layers:
+            edges, offsets = self.segments(start, stop)
+            children = values[:, self.child_idx[edges]]
+            if kind == SUM and log:
+                children += self.log_weights[edges]
+                values[:, start:stop] = self._logsumexp(children, offsets, start, stop)
+            elif kind == SUM:
+                children *= self.weights[edges]
+                values[:, start:stop] = np.add.reduceat(children, offsets, axis=1)
+            elif log:
+                values[:, start:stop] = np.add.reduceat(children, offsets, axis=1)
+            else:
+                values[:, start:stop] = np.multiply.reduceat(children, offsets, axis=1)
+        return values
+
+    def _logsumexp(
+        self, children: np.ndarray, offsets: np.ndarray, start: int, stop: int
+    ) -> np.ndarray:
+        """Log-sum-exp of each segment of `children`, shifted by the segment's max."""
+        shift = np.maximum.reduceat(children, offsets, axis=1)
+        shift[~np.isfinite(shift)] = 0.0
+        children -= np.repeat(shift, self.counts(start, stop), axis=1)
+        with np.errstate(divide="ignore"):
+            return np.log(np.add.reduceat(np.exp(children), offsets, axis=1)) + shift
+
+    def evaluate(self, evidence: np.ndarray, log: bool = False) -> np.ndarray:
+        """Return the probability (or log-probability) of each evidence row."""
+        return self.forward(evidence, log=log)[:, self.root]
+
+    def backward(self, values: np.ndarray) -> np.ndarray:
+        """Return the (N, n_nodes) derivative of the root with respect to every node.
+
+        `values` are the node values returned by :meth:`forward`.
+        """
+        derivatives = np.zeros_like(values)
+        derivatives[:, self.root] = 1.0
+        for kind, start, stop in reversed(self.layers):
+            edges, offsets = self.segments(start, stop)
+            counts = self.counts(start, stop)
+            parents = np.repeat(derivatives[:, start:stop], counts, axis=1)
+            if kind == SUM:
+                contributions = parents * self.weights[edges]
+            else:
+                # Product of the siblings of each child, without dividing by zero
+                children = values[:, self.child_idx[edges]]
+                zero = children == 0
+                safe = np.where(zero, 1.0, children)
+                nonzero_product = np.multiply.reduceat(safe, offsets, axis=1)
+                zeros = np.add.reduceat(zero, offsets, axis=1)
+                nonzero_product = np.repeat(nonzero_product, counts, axis=1)
+                zeros = np.repeat(zeros, counts, axis=1)
+                siblings = np.where(zero, nonzero_product, nonzero_product / safe)
+                siblings[zeros - zero > 0] = 0.0
+                contributions = parents * siblings
+            np.add.at(derivatives, (slice(None), self.child_idx[edges]), contributions)
+        return derivatives
+
+    def marginals(self, evidence: np.ndarray) -> np.ndarray:
+        """Return P(X_v = k, rest of the evidence) as an (N, n_vars, max_card) array.
+
+        One forward and one backward pass give every leaf's marginal at once:
+        in a complete and decomposable SPN the derivative of the root with
+        respect to the indicator of X_v = k is the probability of X_v = k
+        with the evidence on the other variables.
+        """
+        evidence = np.atleast_2d(evidence)
+        derivatives = self.backward(self.forward(evidence))
+        marginals = np.zeros((len(evidence), self.n_vars, self.cardinality.max()))
+        np.add.at(
+            marginals,
+            (slice(None), self.var[: self.n_leaves], self.value[: self.n_leaves]),
+            derivatives[:, : self.n_leaves],
+        )
+        return marginals
+
+    def max_forward(self, evidence: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (N, n_nodes) log values of the max-product network, and choices.
+
+        Sum nodes are replaced by weighted max nodes. The (N, n_nodes) choices
+        hold the first edge of every sum node reaching its max, and -1 for
+        other nodes.
+        """
+        evidence = np.atleast_2d(evidence)
+        values = np.empty((len(evidence), len(self)))
+        values[:, : self.n_leaves] = np.where(self.leaves(evidence), 0.0, -np.inf)
+        choice = np.full(values.shape, -1)
+        for kind, start, stop in self.layers:
+            edges, offsets = self.segments(start, stop)
+            children = values[:, self.child_idx[edges]]
+            if kind == PRODUCT:
+                values[:, start:stop] = np.add.reduceat(children, offsets, axis=1)
+                continue
+            children += self.log_weights[edges]
+            best = np.maximum.reduceat(children, offsets, axis=1)
+            is_best = children == np.repeat(best, self.counts(start, stop), axis=1)
+            positions = np.where(
+                is_best, np.arange(edges.start, edges.stop), edges.stop
+            )
+            choice[:, start:stop] = np.minimum.reduceat(positions, offsets, axis=1)
+            # Nodes whose children are all impossible choose their first edge
+            choice[:, start:stop] = np.where(
+                choice[:, start:stop] == edges.stop,
+                self.child_ptr[start:stop],
+                choice[:, start:stop],
+            )
+            values[:, start:stop] = best
+        return values, choice
+
+    def _descend(self, n: int, choose) -> tuple[np.ndarray, np.ndarray]:
+        """Walk down from the root for `n` rows at once, one layer at a time.
+
+        Active product nodes activate all their children, and active sum
+        nodes the edges returned by ``choose(rows, nodes)``, with one entry
+        per active (row, node) pair. Return the (row, leaf) pairs reached.
+
+        Active pairs are kept as index arrays, bucketed by the layer of their
+        node, so memory follows the nodes reached rather than the network.
+        """
+        buckets = [[] for _ in range(len(self.layers) + 1)]
+        buckets[-2].append((np.arange(n), np.full(n, self.root)))
+        for i in reversed(range(len(self.layers))):
+            kind, start, stop = self.layers[i]
+            if not buckets[i]:
+                continue
+            rows = np.concatenate([rows for rows, _ in buckets[i]])
+            nodes = np.concatenate([nodes for _, nodes in buckets[i]])
+            buckets[i] = None
+            if kind == SUM:
+                edges = choose(rows, nodes)
+            else:
+                counts = self.counts(start, stop)[nodes - start]
+                # Edges of every active (row, node): first edge of the node + rank
+                first = np.repeat(self.child_ptr[nodes], counts)
+                rank = np.arange(len(first)) - np.repeat(
+                    np.cumsum(counts) - counts, counts
+                )
+                edges = first + rank
+                rows = np.repeat(rows, counts)
+            children = self.child_idx[edges]
+            layers = self.layer_of[children]
+            order = np.argsort(layers, kind="stable")
+            rows, children, layers = rows[order], children[order], layers[order]
+            targets, bounds = np.unique(layers, return_index=True)
+            for target, a, b in zip(targets, bounds, [*bounds[1:], len(layers)]):
+                buckets[target].append((rows[a:b], children[a:b]))
+        if not buckets[-1]:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return (
+            np.concatenate([rows for rows, _ in buckets[-1]]),
+            np.concatenate([leaves for _, leaves in buckets[-1]]),
+        )
+
+    def mpe(self, evidence: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the most probable completion of each evidence row and its log value.
+
+        Variables set to -1 are maximized out, the others keep their
+        evidence. The completions are traced back top-down from the root for
+        all rows at once, following the choice of every active sum node.
+        """
+        evidence = np.atleast_2d(evidence)
+        values, choice = self.max_forward(evidence)
+        rows, leaves = self._descend(
+            len(evidence), lambda rows, nodes: choice[rows, nodes]
+        )
+        assignment = evidence.copy()
+        assignment[rows, self.var[leaves]] = self.value[leaves]
+        return assignment, values[:, self.root]
+
+    def sample(
+        self, n: int, chunk: int = 1 << 12, seed: int | None = None
+    ) -> Iterator[np.ndarray]:
+        """Yield `n` joint samples as (chunk, n_vars) arrays (the last one shorter).
+
+        Samples are drawn top-down for a whole chunk at once: every active
+        sum node draws one of its edges with probability proportional to its
+        weight, by a binary search in the cumulative weights of all edges.
+        """
+        rng = np.random.default_rng(seed)
+        cumulative = np.cumsum(self.weights)
+
+        def draw(rows: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+            first, last = self.child_ptr[nodes], self.child_ptr[nodes + 1] - 1
+            base = cumulative[first] - self.weights[first]
+            target = base + rng.random(len(nodes)) * (cumulative[last] - base)
+            edges = np.searchsorted(cumulative, target, side="right")
+            return np.clip(edges, first, last)
+
+        for start in range(0, n, chunk):
+            size = min(chunk, n - start)
+            rows, leaves = self._descend(size, draw)
+            samples = np.full((size, self.n_vars), -1)
+            samples[rows, self.var[leaves]] = self.value[leaves]
+            yield samples
+
+    def scopes(self) -> np.ndarray:
+        """Return the scope of every node as an (n_nodes, words) uint64 bitset.
+
+        Bit ``v % 64`` of word ``v // 64`` is set if variable v is in the scope.
+        """
+        words = (self.n_vars + 63) // 64
+        scopes = np.zeros((len(self), words), dtype=np.uint64)
+        var = self.var[: self.n_leaves]
+        scopes[np.arange(self.n_leaves), var // 64] = np.left_shift(
+            np.uint64(1), (var % 64).astype(np.uint64)
+        )
+        for _, start, stop in self.layers:
+            edges, offsets = self.segments(start, stop)
+            scopes[start:stop] = np.bitwise_or.reduceat(
+                scopes[self.child_idx[edges]], offsets, axis=0
+            )
+        return scopes
+
+    def invalid(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the incomplete sum nodes and the non-decomposable product nodes.
+
+        A sum node is complete if all its children have the same scope, and
+        a product node is decomposable if the scopes of its children are
+        disjoint, i.e. their sizes add up to the size of its scope.
+        """
+        scopes = self.scopes()
+        parents = np.repeat(np.arange(len(self)), np.diff(self.child_ptr))
+        children = scopes[self.child_idx]
+        differs = np.any(children != scopes[parents], axis=1)
+        incomplete = np.zeros(len(self), dtype=bool)
+        incomplete[parents[differs]] = True
+        sizes = np.unpackbits(scopes.view(np.uint8), axis=1).sum(axis=1)
+        children_sizes = np.bincount(
+            parents, sizes[self.child_idx], minlength=len(self)
+        )
+        overlapping = children_sizes != sizes
+        return (
+            np.flatnonzero(incomplete & (self.kind == SUM)),
+            np.flatnonzero(overlapping & (self.kind == PRODUCT)),
+        )
+
+    def check(self):
+        """Raise ValueError if the SPN is not complete and decomposable."""
+        incomplete, overlapping = self.invalid()
+        names = self.names if self.names is not None else range(len(self))
+        errors = []
+        if len(incomplete):
+            errors.append(f"incomplete sum nodes {[names[i] for i in incomplete]}")
+        if len(overlapping):
+            errors.append(
+                f"non-decomposable product nodes {[names[i] for i in overlapping]}"
+            )
+        if errors:
+            raise ValueError("Invalid SPN: " + ", ".join(errors))
+
+
+def compile(graph: nx.DiGraph) -> SPN:
+    """Compile an SPN graph (see module docstring) into an :class:`SPN`."""
+    roots = [n for n, degree in graph.in_degree if degree == 0]
+    if len(roots) != 1:
+        raise ValueError(f"An SPN has exactly one root, got {roots}")
+    height = {}
+    for node in reversed(list(nx.topological_sort(graph))):
+        kind = KINDS[graph.nodes[node]["kind"]]
+        children = list(graph.successors(node))
+        if (kind == LEAF) != (not children):
+            raise ValueError(f"Only leaves can have no children, got {node!r}")
+        height[node] = max((height[c] + 1 for c in children), default=0)
+    order = sorted(graph, key=lambda n: (height[n], KINDS[graph.nodes[n]["kind"]]))
+    index = {node: i for i, node in enumerate(order)}
+
+    kind = np.array([KINDS[graph.nodes[n]["kind"]] for n in order], dtype=np.int8)
+    var = np.array([graph.nodes[n].get("var", -1) for n in order], dtype=int)
+    value = np.array([graph.nodes[n].get("value", -1) for n in order], dtype=int)
+    child_ptr = np.zeros(len(order) + 1, dtype=int)
+    child_idx, weights = [], []
+    for i, node in enumerate(order):
+        for child in graph.successors(node):
+            child_idx.append(index[child])
+            weights.append(graph.edges[node, child].get("weight", 1.0))
+        child_ptr[i + 1] = len(child_idx)
+    return SPN(
+        kind,
+        var,
+        value,
+        child_ptr,
+        np.array(child_idx, dtype=int),
+        np.array(weights, dtype=float),
+        names=order,
+    )
+
+
+def random_spn(
+    n_vars: int,
+    cardinality: int = 2,
+    branching: int = 2,
+    seed: int | None = None,
+) -> nx.DiGraph:
+    """Return a random complete and decomposable SPN graph over `n_vars` variables.
+
+    Every sum node mixes `branching` product nodes, each splitting the
+    variables of the sum in two random halves, down to sums over the
+    indicators of a single variable. Weights are drawn from a flat Dirichlet
+    distribution. The network has about ``n_vars ** log2(2 * branching)``
+    nodes.
+    """
+    rng = np.random.default_rng(seed)
+    g = nx.DiGraph()
+    for v in range(n_vars):
+        for k in range(cardinality):
+            g.add_node(f"x{v}={k}", kind="leaf", var=v, value=k)
+
+    def build(variables: np.ndarray) -> str:
+        node = f"s{len(g)}"
+        g.add_node(node, kind="sum")
+        if len(variables) == 1:
+            children = [f"x{variables[0]}={k}" for k in range(cardinality)]
+        else:
+            children = []
+            for _ in range(branching):
+                product = f"p{len(g)}"
+                g.add_node(product, kind="product")
+                split = rng.permutation(variables)
+                half = len(variables) // 2
+                g.add_edges_from(
+                    (product, build(part)) for part in (split[:half], split[half:])
+                )
+                children.append(product)
+        for child, weight in zip(children, rng.dirichlet(np.ones(len(children)))):
+            g.add_edge(node, child, weight=weight)
+        return node
+
+    build(np.arange(n_vars))
+    return g
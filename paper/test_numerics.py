@@ -0,0 +1,366 @@
+"""test_numerics.py - Numerical code checked against brute-force enumeration.
+
+Networks are small enough to enumerate every assignment, and every
+reference is computed from the networkx graph or dense tables, not from
+the compiled arrays under test.
+
+    python -m pytest -q paper
+"""
+
+from __future__ import annotations
+
+import itertools as it
+
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.stats import chi2_contingency
+
+import credal
+import independence
+import learn
+import spn
+from joint import FactorizedJoint
+
+
+def mixture_spn() -> nx.DiGraph:
+    """Return a mixture of two products over a binary and a ternary variable."""
+    g = nx.DiGraph()
+    for var, cardinality in enumerate((2, 3)):
+        for k in range(cardinality):
+            g.add_node(f"x{var}={k}", kind="leaf", var=var, value=k)
+    g.add_node("root", kind="sum")
+    for i, (p, q) in enumerate(
+        (([0.3, 0.7], [0.2, 0.5, 0.3]), ([0.9, 0.1], [0.6, 0.1, 0.3]))
+    ):
+        g.add_node(f"p{i}", kind="product")
+        g.add_edge("root", f"p{i}", weight=(0.4, 0.6)[i])
+        for var, weights in enumerate((p, q)):
+            g.add_node(f"s{i}{var}", kind="sum")
+            g.add_edge(f"p{i}", f"s{i}{var}")
+            for k, w in enumerate(weights):
+                g.add_edge(f"s{i}{var}", f"x{var}={k}", weight=w)
+    return g
+
+
+def shared_spn() -> nx.DiGraph:
+    """Return a network over three binary variables with shared subnetworks."""
+    g = nx.DiGraph()
+    for var in range(3):
+        for k in range(2):
+            g.add_node(f"x{var}={k}", kind="leaf", var=var, value=k)
+    for var, weights in ((1, (0.4, 0.6)), (2, (0.7, 0.3))):
+        g.add_node(f"s{var}", kind="sum")
+        for k, w in enumerate(weights):
+            g.add_edge(f"s{var}", f"x{var}={k}", weight=w)
+    # t is a child of both q0 and q1
+    g.add_node("t", kind="product")
+    g.add_edges_from((("t", "s1"), ("t", "s2")))
+    g.add_node("root", kind="sum")
+    for k, (w, a) in enumerate(((0.2, 0.9), (0.8, 0.3))):
+        g.add_node(f"u{k}", kind="product")
+        g.add_edges_from(((f"u{k}", f"x1={k}"), (f"u{k}", f"x2={1 - k}")))
+        g.add_node(f"q{k}", kind="sum")
+        g.add_edge(f"q{k}", "t", weight=a)
+        g.add_edge(f"q{k}", f"u{k}", weight=1 - a)
+        g.add_node(f"p{k}", kind="product")
+        g.add_edges_from(((f"p{k}", f"x0={k}"), (f"p{k}", f"q{k}")))
+        g.add_edge("root", f"p{k}", weight=w)
+    return g
+
+
+NETWORKS = {
+    "mixture": mixture_spn,
+    "shared": shared_spn,
+    "random": lambda: spn.random_spn(4, cardinality=3, seed=2),
+}
+
+
+def reference(graph: nx.DiGraph, assignment, reduce=sum) -> float:
+    """Evaluate the network polynomial of `graph` at a full assignment.
+
+    With ``reduce=max``, sum nodes take the max of their weighted children.
+    """
+
+    def value(node):
+        data = graph.nodes[node]
+        if data["kind"] == "leaf":
+            return float(assignment[data["var"]] == data["value"])
+        children = [
+            graph.edges[node, c].get("weight", 1.0) * value(c)
+            for c in graph.successors(node)
+        ]
+        return reduce(children) if data["kind"] == "sum" else float(np.prod(children))
+
+    (root,) = [n for n, d in graph.in_degree if d == 0]
+    return value(root)
+
+
+def assignments(cardinality) -> np.ndarray:
+    return np.array(list(it.product(*(range(c) for c in cardinality))))
+
+
+def consistent(full: np.ndarray, evidence: np.ndarray) -> np.ndarray:
+    return np.all((evidence < 0) | (full == evidence), axis=1)
+
+
+def evidence_rows(network: spn.SPN, n: int = 20, seed: int = 0) -> np.ndarray:
+    """Return random evidence rows, with about half the variables unobserved."""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, network.cardinality, size=(n, network.n_vars))
+    return np.where(rng.random(values.shape) < 0.5, -1, values)
+
+
+def dependent_data(n: int, seed: int = 0) -> np.ndarray:
+    """Return `n` rows of four variables of which only the first two depend."""
+    rng = np.random.default_rng(seed)
+    x = np.empty((n, 4), dtype=int)
+    x[:, 0] = rng.integers(0, 3, n)
+    x[:, 1] = (x[:, 0] + (rng.random(n) < 0.3)) % 3
+    x[:, 2] = rng.integers(0, 2, n)
+    x[:, 3] = rng.integers(0, 4, n)
+    return x
+
+
+@pytest.fixture(params=list(NETWORKS))
+def case(request):
+    graph = NETWORKS[request.param]()
+    network = spn.compile(graph)
+    full = assignments(network.cardinality)
+    joint = np.array([reference(graph, x) for x in full])
+    return graph, network, full, joint
+
+
+def test_joint_is_normalized(case):
+    _, _, _, joint = case
+    assert joint.sum() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("log", [False, True])
+def test_forward(case, log):
+    _, network, full, joint = case
+    evidence = evidence_rows(network)
+    expected = np.array([joint[consistent(full, e)].sum() for e in evidence])
+    values = network.evaluate(evidence, log=log)
+    np.testing.assert_allclose(np.exp(values) if log else values, expected)
+
+
+def test_marginals(case):
+    _, network, full, joint = case
+    evidence = evidence_rows(network)
+    marginals = network.marginals(evidence)
+    for row, e in zip(marginals, evidence):
+        for v, c in enumerate(network.cardinality):
+            for k in range(c):
+                fixed = e.copy()
+                fixed[v] = k
+                expected = joint[consistent(full, fixed)].sum()
+                assert row[v, k] == pytest.approx(expected)
+
+
+def vertices(lower: np.ndarray, upper: np.ndarray) -> list[np.ndarray]:
+    """Return the vertices of {lower <= w <= upper, sum(w) = 1}.
+
+    At a vertex, every weight but at most one is at one of its bounds.
+    """
+    found = []
+    for free in range(len(lower)):
+        others = [i for i in range(len(lower)) if i != free]
+        for bounds in it.product((lower, upper), repeat=len(others)):
+            w = np.empty(len(lower))
+            w[others] = [b[i] for b, i in zip(bounds, others)]
+            w[free] = 1 - w[others].sum()
+            if lower[free] - 1e-12 <= w[free] <= upper[free] + 1e-12:
+                found.append(w)
+    return found
+
+
+def test_credal_bounds_against_vertices():
+    network = spn.compile(mixture_spn())
+    lower, upper = credal.contaminate(network, 0.2)
+    sums = np.flatnonzero(network.kind == spn.SUM)
+    local = [
+        vertices(
+            lower[network.child_ptr[s] : network.child_ptr[s + 1]],
+            upper[network.child_ptr[s] : network.child_ptr[s + 1]],
+        )
+        for s in sums
+    ]
+    evidence = evidence_rows(network)
+    values = []
+    for combination in it.product(*local):
+        weights = network.weights.copy()
+        for s, w in zip(sums, combination):
+            weights[network.child_ptr[s] : network.child_ptr[s + 1]] = w
+        extreme = spn.SPN(
+            network.kind,
+            network.var,
+            network.value,
+            network.child_ptr,
+            network.child_idx,
+            weights,
+        )
+        values.append(extreme.evaluate(evidence))
+    low, high = credal.bounds_batch(network, evidence, lower, upper)
+    np.testing.assert_allclose(low, np.min(values, axis=0), atol=1e-12)
+    np.testing.assert_allclose(high, np.max(values, axis=0), atol=1e-12)
+
+
+def dense(joint: FactorizedJoint) -> np.ndarray:
+    """Return the dense table of `joint`, one axis per variable in order."""
+    operands = []
+    for variables, table in joint.factors:
+        operands += [table, list(variables)]
+    return joint.scale * np.einsum(*operands, list(joint.variables))
+
+
+def test_factorized_joint_against_dense():
+    rng = np.random.default_rng(0)
+    joint = FactorizedJoint(
+        [
+            ((0, 2), rng.random((3, 4))),
+            ((1,), rng.random(2)),
+            ((3, 4), rng.random((2, 3))),
+        ],
+        scale=0.5,
+    )
+    table = dense(joint)
+    np.testing.assert_allclose(joint.table((4, 0)), table.sum(axis=(1, 2, 3)).T)
+    np.testing.assert_allclose(
+        joint.table((2, 3), {0: 1, 4: 2}), table[1, :, :, :, 2].sum(axis=0)
+    )
+    assert joint.prob({1: 0, 3: 1}) == pytest.approx(table[:, 0, :, 1].sum())
+    conditional = joint.condition({2: 3})
+    np.testing.assert_allclose(
+        dense(conditional), table[:, :, 3] / table[:, :, 3].sum()
+    )
+    np.testing.assert_allclose(dense(joint.marginalize({1, 3})), table.sum(axis=(1, 3)))
+    assert FactorizedJoint.dice(3).table((0, 1, 2)) == pytest.approx(
+        np.full((6, 6, 6), 1 / 216)
+    )
+
+
+def test_factorized_joint_rejects_invalid_queries():
+    joint = FactorizedJoint([((0, 1), np.array([[0.5, 0.0], [0.0, 0.5]]))])
+    with pytest.raises(ValueError):
+        joint.table((0,), {0: 1})
+    with pytest.raises(ValueError):
+        joint.table((0, 0))
+    with pytest.raises(ValueError):
+        joint.table((2,))
+    with pytest.raises(ValueError):
+        joint.condition({0: 2})
+    with pytest.raises(ValueError):
+        joint.condition({0: 0, 1: 1})
+    assert joint.condition({0: 0, 1: 1}, normalize=False).scale == 0.0
+
+
+def test_check_accepts_valid_networks(case):
+    _, network, _, _ = case
+    network.check()
+    assert all(len(nodes) == 0 for nodes in network.invalid())
+
+
+def test_check_names_invalid_nodes():
+    # A sum over two variables, as incomplete_sum_spn in main.py
+    g = nx.DiGraph()
+    g.add_node("+", kind="sum")
+    for var, leaf in enumerate(("x1", "x2")):
+        g.add_node(leaf, kind="leaf", var=var, value=1)
+        g.add_edge("+", leaf, weight=0.5)
+    network = spn.compile(g)
+    incomplete, overlapping = network.invalid()
+    assert incomplete.tolist() == [network.names.index("+")]
+    assert overlapping.tolist() == []
+    with pytest.raises(ValueError, match=r"incomplete sum nodes \['\+'\]"):
+        network.check()
+
+    # A product of x1 and not x1, as inconsistent_product_spn in main.py
+    g = nx.DiGraph()
+    g.add_node("x", kind="product")
+    g.add_node("x1", kind="leaf", var=0, value=1)
+    g.add_node("nx1", kind="leaf", var=0, value=0)
+    g.add_edges_from((("x", "x1"), ("x", "nx1")))
+    network = spn.compile(g)
+    incomplete, overlapping = network.invalid()
+    assert incomplete.tolist() == []
+    assert overlapping.tolist() == [network.names.index("x")]
+    with pytest.raises(ValueError, match=r"non-decomposable product nodes \['x'\]"):
+        network.check()
+
+    # A sum deep in a valid network that also mixes in the other variable:
+    # it and its parent product are invalid, the root is not
+    g = mixture_spn()
+    g.add_edge("s00", "x1=0", weight=0.5)
+    network = spn.compile(g)
+    incomplete, overlapping = network.invalid()
+    assert incomplete.tolist() == [network.names.index("s00")]
+    assert overlapping.tolist() == [network.names.index("p0")]
+
+
+def test_learn_is_valid_and_independent_of_jobs():
+    data = dependent_data(3000)
+    serial = learn.learn(data, min_rows=200, jobs=1)
+    parallel = learn.learn(data, min_rows=200, jobs=2, local_size=0)
+    serial.check()
+    for name in ("kind", "var", "value", "child_ptr", "child_idx", "weights"):
+        np.testing.assert_array_equal(getattr(serial, name), getattr(parallel, name))
+    full = assignments(serial.cardinality)
+    assert serial.evaluate(full).sum() == pytest.approx(1.0)
+
+
+def test_g_test_p_values_against_scipy():
+    n = 2000
+    x = dependent_data(n)
+    cardinality = x.max(axis=0) + 1
+    p = independence.p_values(independence.contingency(x, cardinality), n)
+    for i, j in it.combinations(range(x.shape[1]), 2):
+        table = np.zeros((cardinality[i], cardinality[j]))
+        np.add.at(table, (x[:, i], x[:, j]), 1)
+        expected = chi2_contingency(
+            table, correction=False, lambda_="log-likelihood"
+        ).pvalue
+        assert p[i, j] == pytest.approx(expected, rel=1e-6, abs=1e-300)
+        assert p[j, i] == pytest.approx(expected, rel=1e-6, abs=1e-300)
+    groups = independence.components(x, np.arange(n), np.arange(4), cardinality)
+    assert sorted(map(list, groups)) == [[0, 1], [2], [3]]
+
+
+def test_mpe(case):
+    graph, network, full, _ = case
+    evidence = evidence_rows(network)
+    max_product = np.array([reference(graph, x, reduce=max) for x in full])
+    assignment, log_value = network.mpe(evidence)
+    for e, x, value in zip(evidence, assignment, log_value):
+        assert np.all((e < 0) | (x == e))
+        assert np.exp(value) == pytest.approx(max_product[consistent(full, e)].max())
+        assert reference(graph, x, reduce=max) == pytest.approx(np.exp(value))
+
+
+def test_sample_frequencies(case):
+    _, network, full, joint = case
+    n = 200_000
+    samples = np.concatenate(list(network.sample(n, chunk=30_000, seed=0)))
+    assert samples.shape == (n, network.n_vars)
+    codes = np.ravel_multi_index(samples.T, network.cardinality)
+    frequencies = np.bincount(codes, minlength=len(full)) / n
+    # Five standard deviations of each frequency
+    np.testing.assert_array_less(
+        np.abs(frequencies - joint), 5 * np.sqrt(joint * (1 - joint) / n) + 1e-12
+    )
+
+
+def test_contingency_cache_tells_matrices_apart():
+    cache = independence.ContingencyCache()
+    rows, variables, cardinality = np.arange(5000), np.arange(2), np.array([2, 2])
+    independent = np.random.default_rng(0).integers(0, 2, size=(5000, 2))
+    x = independent[:, [0, 0]]
+    assert (
+        len(independence.components(x, rows, variables, cardinality, cache=cache)) == 1
+    )
+    # CPython hands the id of a freed array to the next one
+    del x
+    x = independent.copy()
+    assert (
+        len(independence.components(x, rows, variables, cardinality, cache=cache)) == 2
+    )
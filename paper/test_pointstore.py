@@ -0,0 +1,94 @@
+"""test_pointstore.py - Round trips of mobjects through the on-disk point store.
+
+Needs manim, and LaTeX for the MathTex case.
+
+    python -m pytest -q paper
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+manim = pytest.importorskip("manim")
+
+import pointstore  # noqa: E402
+from dieface import DieFace  # noqa: E402
+
+
+def round_trip(mobject):
+    skeleton, points = pointstore.split(mobject)
+    return pointstore.join(json.loads(json.dumps(skeleton)), points.copy())
+
+
+def assert_same(a, b):
+    """Assert that two families have the same classes, points and styles."""
+    family_a, family_b = a.get_family(), b.get_family()
+    assert len(family_a) == len(family_b)
+    for x, y in zip(family_a, family_b):
+        assert type(x) is type(y)
+        np.testing.assert_array_equal(x.points, y.points)
+        if isinstance(x, manim.VMobject):
+            np.testing.assert_array_equal(x.get_fill_rgbas(), y.get_fill_rgbas())
+            np.testing.assert_array_equal(x.get_stroke_rgbas(), y.get_stroke_rgbas())
+            assert x.get_stroke_width() == y.get_stroke_width()
+
+
+@pytest.mark.skipif(shutil.which("latex") is None, reason="needs LaTeX")
+def test_math_tex():
+    tex = manim.MathTex("x^2", "+", "y", tex_to_color_map={"y": manim.RED})
+    copy = round_trip(tex)
+    assert_same(tex, copy)
+    assert copy.tex_strings == tex.tex_strings
+    assert copy.tex_template.body == tex.tex_template.body
+    assert copy.font_size == pytest.approx(tex.font_size)
+    np.testing.assert_array_equal(
+        copy.get_part_by_tex("y").points, tex.get_part_by_tex("y").points
+    )
+    tex.set_color_by_tex("x", manim.BLUE)
+    copy.set_color_by_tex("x", manim.BLUE)
+    assert_same(tex, copy)
+    assert_same(tex.copy(), copy.copy())
+
+
+def test_paragraph():
+    paragraph = manim.Paragraph("one", "two lines", alignment="left")
+    copy = round_trip(paragraph)
+    assert_same(paragraph, copy)
+    assert all(a is b for a, b in zip(copy.lines[0], copy.submobjects))
+    assert copy.lines[1] == paragraph.lines[1]
+    assert_same(paragraph.lines_text, copy.lines_text)
+    np.testing.assert_array_equal(
+        copy.lines_initial_positions, paragraph.lines_initial_positions
+    )
+    paragraph._set_line_alignment("right", 1)
+    copy._set_line_alignment("right", 1)
+    assert_same(paragraph, copy)
+
+
+def test_die_face():
+    face = DieFace(5)
+    copy = round_trip(face)
+    assert_same(face, copy)
+    assert (copy.value, copy.index) == (5, 5)
+    assert len(copy.submobjects[1]) == 5
+    assert_same(face.copy(), copy.copy())
+
+
+def test_store(tmp_path):
+    built = pointstore.PointStore(tmp_path).get(("face", 3), lambda: DieFace(3))
+
+    def fail():
+        raise AssertionError("The entry was not read from disk")
+
+    assert_same(built, pointstore.PointStore(tmp_path).get(("face", 3), fail))
+
+
+def test_unknown_classes_are_rejected():
+    skeleton, points = pointstore.split(DieFace(1))
+    skeleton["members"][0]["class"] = "os._wrap_close"
+    with pytest.raises(ValueError):
+        pointstore.join(skeleton, points)
@@ -0,0 +1,211 @@
+"""writer.py - Encode each section of a scene as one continuous stream.
+
+By default manim encodes every ``play`` and ``wait`` call into its own
+partial movie file, with its own ffmpeg process, and concatenates them at
+the end. :class:`StreamFileWriter` keeps a single ffmpeg pipe open for each
+section instead: consecutive animations and waits are written to the same
+stream, so a section is one partial movie file and one encoder session
+however many short animations it plays. Partial movies cannot be reused
+across renders in this mode, so the per-animation cache is not consulted.
+
+:class:`HeldFrameRenderer` makes static waits cheap: when no mobject is
+updating during a ``wait``, the frame is rasterized once. By default a wait
+is a partial movie of its own, so the frame is also sent to ffmpeg once,
+and ffmpeg repeats it for the duration of the wait (``tpad`` filter, see
+:class:`HeldFrameFileWriter`). In stream mode the held frame stays in the
+stream of its section: it is still rasterized once, but written to the
+open pipe for every frame of the wait.
+
+    scene = SectionScene(renderer=writer.renderer(stream=True))
+"""
+
+from __future__ import annotations
+
+import subprocess
+
+import numpy as np
+from manim import __version__, config
+from manim.renderer.cairo_renderer import CairoRenderer
+from manim.scene.scene_file_writer import SceneFileWriter
+from manim.utils.file_ops import is_png_format, is_webm_format, write_to_movie
+
+
+def held_frame_command(file_path: str, num_frames: int) -> list[str]:
+    """Return the ffmpeg command encoding one raw frame `num_frames` times.
+
+    Input and codec options are those of SceneFileWriter.open_movie_pipe, so
+    the movie can be concatenated with the other partial movies.
+    """
+    fps = config.frame_rate
+    command = [
+        config.ffmpeg_executable,
+        "-y",
+        "-f",
+        "rawvideo",
+        "-s",
+        f"{config.pixel_width}x{config.pixel_height}",
+        "-pix_fmt",
+        "rgba",
+        "-r",
+        str(int(fps) if fps == int(fps) else fps),
+        "-i",
+        "-",
+        "-an",
+        "-loglevel",
+        config.ffmpeg_loglevel.lower(),
+        "-metadata",
+        f"comment=Rendered with Manim Community v{__version__}",
+        "-vf",
+        f"tpad=stop_mode=clone:stop={num_frames - 1}",
+    ]
+    if is_webm_format():
+        command += ["-vcodec", "libvpx-vp9", "-auto-alt-ref", "0"]
+    elif config.transparent:
+        command += ["-vcodec", "qtrle"]
+    else:
+        command += ["-vcodec", "libx264", "-pix_fmt", "yuv420p"]
+    return command + [file_path]
+
+
+class HeldFrameFileWriter(SceneFileWriter):
+    """Scene file writer opening the ffmpeg pipe of a partial movie at its first frame.
+
+    Until then the pipe is pending, so a partial movie that starts with a
+    held frame (see :meth:`hold_frame`) gets a pipe that reads that frame
+    once and has ffmpeg repeat it.
+    """
+
+    def __init__(self, renderer, scene_name, **kwargs):
+        self.pending_path: str | None = None
+        super().__init__(renderer, scene_name, **kwargs)
+
+    def open_movie_pipe(self, file_path=None):
+        if file_path is None:
+            file_path = self.partial_movie_files[self.renderer.num_plays]
+        self.pending_path = str(file_path)
+
+    def _open_pending(self, num_frames: int = 0):
+        """Open the pending pipe, reading a frame held `num_frames` times if given."""
+        file_path, self.pending_path = self.pending_path, None
+        if not num_frames:
+            super().open_movie_pipe(file_path=file_path)
+            return
+        self.partial_movie_file_path = file_path
+        self.writing_process = subprocess.Popen(
+            held_frame_command(file_path, num_frames), stdin=subprocess.PIPE
+        )
+
+    def write_frame(self, frame_or_renderer):
+        if self.pending_path is not None:
+            self._open_pending()
+        super().write_frame(frame_or_renderer)
+
+    def close_movie_pipe(self):
+        if self.pending_path is not None:
+            self._open_pending()
+        super().close_movie_pipe()
+
+    def hold_frame(self, frame: np.ndarray, num_frames: int):
+        """Write `frame` `num_frames` times to the current partial movie.
+
+        The frame goes through the pipe once if it starts the partial movie,
+        and for every frame otherwise.
+        """
+        if not num_frames:
+            return
+        if self.pending_path is not None:
+            self._open_pending(num_frames)
+            num_frames = 1
+        data = frame.tobytes()
+        for _ in range(num_frames):
+            self.writing_process.stdin.write(data)
+
+
+class StreamFileWriter(HeldFrameFileWriter):
+    """Scene file writer with one partial movie file per section."""
+
+    def __init__(self, renderer, scene_name, **kwargs):
+        self.stream_path: str | None = None
+        super().__init__(renderer, scene_name, **kwargs)
+
+    def add_partial_movie_file(self, hash_animation: str):
+        # Only the first animation written in a section opens a partial movie
+        if (
+            hash_animation is None
+            or self.stream_path is not None
+            or not hasattr(self, "partial_movie_directory")
+            or not write_to_movie()
+        ):
+            return
+        self.stream_path = str(
+            self.partial_movie_directory
+            / f"stream_{len(self.partial_movie_files):05}{config.movie_file_extension}"
+        )
+        self.partial_movie_files.append(self.stream_path)
+        self.sections[-1].partial_movie_files.append(self.stream_path)
+
+    def is_already_cached(self, hash_invocation: str) -> bool:
+        return False
+
+    def begin_animation(self, allow_write: bool = False, file_path=None):
+        if write_to_movie() and allow_write and not self.streaming:
+            self.open_movie_pipe(file_path=self.stream_path)
+
+    def end_animation(self, allow_write: bool = False):
+        pass
+
+    @property
+    def streaming(self) -> bool:
+        return self.pending_path is not None or (
+            hasattr(self, "writing_process") and not self.writing_process.stdin.closed
+        )
+
+    def end_stream(self):
+        """Close the stream of the current section, if any."""
+        if self.streaming:
+            self.close_movie_pipe()
+        self.stream_path = None
+
+    def hold_frame(self, frame: np.ndarray, num_frames: int):
+        # The stream goes on after the wait, so it is opened as usual and the
+        # frame is written for every frame of the wait instead of padded
+        if num_frames and self.pending_path is not None:
+            self._open_pending()
+        super().hold_frame(frame, num_frames)
+
+    def next_section(self, name: str, type: str, skip_animations: bool):
+        self.end_stream()
+        super().next_section(name, type, skip_animations)
+
+    def finish(self):
+        self.end_stream()
+        super().finish()
+
+
+class HeldFrameRenderer(CairoRenderer):
+    """Cairo renderer writing static waits as one frame held for their duration."""
+
+    def freeze_current_frame(self, duration: float):
+        if (
+            self.skip_animations
+            or not write_to_movie()
+            or is_png_format()
+            or not isinstance(self.file_writer, HeldFrameFileWriter)
+        ):
+            return super().freeze_current_frame(duration)
+        dt = 1 / self.camera.frame_rate
+        num_frames = int(duration / dt)
+        self.time += num_frames * dt
+        self.file_writer.hold_frame(self.get_frame(), num_frames)
+
+
+def renderer(stream: bool = False, **kwargs) -> HeldFrameRenderer:
+    """Return a renderer for ``Scene(renderer=...)``.
+
+    Static waits are held by :class:`HeldFrameFileWriter`. With `stream`,
+    each section is encoded as one stream by :class:`StreamFileWriter`.
+    """
+    kwargs.setdefault(
+        "file_writer_class", StreamFileWriter if stream else HeldFrameFileWriter
+    )
+    return HeldFrameRenderer(**kwargs)